@@ -0,0 +1,77 @@
+import argparse
+import glob
+import logging
+import statistics
+import time
+
+import PyPDF2
+from dotenv import load_dotenv
+
+# Load environment variables before pdfExtractor reads its settings
+load_dotenv()
+
+from pdfExtractor import EXTRACTORS
+
+# Configure logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
+    handlers=[
+        logging.FileHandler('benchmark.log'),
+        logging.StreamHandler()
+    ]
+)
+logger = logging.getLogger(__name__)
+
+DEFAULT_CORPUS = '../../../../class-*/math/ncert/book/**/*.pdf'
+
+
+def count_pages(pdf_path):
+    """Return the number of pages in the PDF."""
+    with open(pdf_path, 'rb') as f:
+        return len(PyPDF2.PdfReader(f).pages)
+
+
+def benchmark_extractor(extractor, pdf_paths):
+    """Extract every PDF once and return per-page latencies in milliseconds."""
+    per_page_ms = []
+    failures = 0
+    for pdf_path in pdf_paths:
+        pages = count_pages(pdf_path)
+        if not pages:
+            continue
+        start = time.perf_counter()
+        try:
+            extractor.extract(pdf_path)
+        except Exception as e:
+            failures += 1
+            logger.error(f"{extractor.name} failed on {pdf_path}: {e}")
+            continue
+        elapsed_ms = (time.perf_counter() - start) * 1000
+        per_page_ms.append(elapsed_ms / pages)
+    return per_page_ms, failures
+
+
+def main():
+    """Compare per-page extraction latency of the available backends."""
+    parser = argparse.ArgumentParser(description="Benchmark PDF text extraction backends")
+    parser.add_argument('--corpus', default=DEFAULT_CORPUS, help="Glob of PDF files to extract")
+    parser.add_argument('--backends', nargs='+', default=sorted(EXTRACTORS), help="Backends to benchmark")
+    args = parser.parse_args()
+
+    pdf_paths = sorted(glob.glob(args.corpus, recursive=True))
+    logger.info(f"Benchmarking {args.backends} on {len(pdf_paths)} PDF files")
+
+    print(f"{'backend':<10} {'files':>6} {'failed':>6} {'mean ms/page':>13} {'p50 ms/page':>12} {'p95 ms/page':>12}")
+    for name in args.backends:
+        per_page_ms, failures = benchmark_extractor(EXTRACTORS[name](), pdf_paths)
+        if not per_page_ms:
+            print(f"{name:<10} {0:>6} {failures:>6} {'-':>13} {'-':>12} {'-':>12}")
+            continue
+        p95 = statistics.quantiles(per_page_ms, n=20)[-1] if len(per_page_ms) > 1 else per_page_ms[0]
+        print(f"{name:<10} {len(per_page_ms):>6} {failures:>6} {statistics.mean(per_page_ms):>13.2f} "
+              f"{statistics.median(per_page_ms):>12.2f} {p95:>12.2f}")
+
+
+if __name__ == "__main__":
+    main()
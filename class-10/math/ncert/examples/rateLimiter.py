@@ -0,0 +1,95 @@
+import asyncio
+import logging
+import os
+import time
+from collections import OrderedDict, deque
+
+logger = logging.getLogger(__name__)
+
+GEMINI_REQUESTS_PER_MINUTE = int(os.getenv('GEMINI_REQUESTS_PER_MINUTE', '15'))
+GEMINI_TOKENS_PER_MINUTE = int(os.getenv('GEMINI_TOKENS_PER_MINUTE', '1000000'))
+GEMINI_EXPECTED_OUTPUT_TOKENS = int(os.getenv('GEMINI_EXPECTED_OUTPUT_TOKENS', '2000'))
+
+
+class TokenBucket:
+    """A bucket of capacity units refilled continuously at capacity per minute."""
+
+    def __init__(self, per_minute):
+        self.capacity = float(per_minute)
+        self.rate = per_minute / 60.0
+        self.tokens = float(per_minute)
+        self.updated_at = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+
+    def wait_time(self, amount):
+        """Seconds until amount units are available."""
+        self._refill()
+        missing = min(amount, self.capacity) - self.tokens
+        return max(0.0, missing / self.rate) if self.rate else float('inf')
+
+    def take(self, amount):
+        self._refill()
+        self.tokens -= min(amount, self.capacity)
+
+
+class GeminiScheduler:
+    """
+    Admits Gemini calls within requests-per-minute and tokens-per-minute budgets.
+
+    Waiting calls are queued per caller and admitted round-robin, so one busy
+    driver cannot starve the others.
+    """
+
+    def __init__(self, requests_per_minute=GEMINI_REQUESTS_PER_MINUTE, tokens_per_minute=GEMINI_TOKENS_PER_MINUTE):
+        self.request_bucket = TokenBucket(requests_per_minute)
+        self.token_bucket = TokenBucket(tokens_per_minute)
+        self._queues = OrderedDict()
+        self._pump_task = None
+        self.admitted = 0
+        self.total_wait_seconds = 0.0
+
+    async def acquire(self, estimated_tokens, caller="default"):
+        """Wait until the call is admitted under both budgets."""
+        future = asyncio.get_running_loop().create_future()
+        self._queues.setdefault(caller, deque()).append((future, estimated_tokens, time.monotonic()))
+        if self._pump_task is None or self._pump_task.done():
+            self._pump_task = asyncio.create_task(self._pump())
+        await future
+
+    async def _pump(self):
+        while self._queues:
+            caller, queue = next(iter(self._queues.items()))
+            future, estimated_tokens, queued_at = queue[0]
+            if future.cancelled():
+                queue.popleft()
+            else:
+                wait = max(self.request_bucket.wait_time(1), self.token_bucket.wait_time(estimated_tokens))
+                if wait > 0:
+                    await asyncio.sleep(wait)
+                    continue
+                queue.popleft()
+                # Rotate the caller to the back so the next admission goes to someone else
+                self._queues.move_to_end(caller)
+                self.request_bucket.take(1)
+                self.token_bucket.take(estimated_tokens)
+                waited = time.monotonic() - queued_at
+                self.admitted += 1
+                self.total_wait_seconds += waited
+                logger.info(f"Admitted Gemini call for {caller} after {waited:.2f}s ({estimated_tokens} estimated tokens)")
+                future.set_result(None)
+            if not queue:
+                del self._queues[caller]
+
+    def stats(self):
+        """Return admission counters and current queue depth per caller."""
+        return {
+            "admitted": self.admitted,
+            "averageWaitSeconds": round(self.total_wait_seconds / self.admitted, 3) if self.admitted else 0.0,
+            "queued": {caller: len(queue) for caller, queue in self._queues.items()},
+            "requestsAvailable": round(self.request_bucket.tokens, 2),
+            "tokensAvailable": round(self.token_bucket.tokens)
+        }
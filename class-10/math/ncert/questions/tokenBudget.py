@@ -0,0 +1,99 @@
+import logging
+import os
+import threading
+from collections import OrderedDict
+
+from questionIndex import estimate_tokens
+from responseCache import hash_text
+
+logger = logging.getLogger(__name__)
+
+GEMINI_MAX_PROMPT_TOKENS = int(os.getenv('GEMINI_MAX_PROMPT_TOKENS', '200000'))
+# Prompt tokens allowed per run (grade/exercise) since the service started, 0 for no limit
+GEMINI_RUN_TOKEN_BUDGET = int(os.getenv('GEMINI_RUN_TOKEN_BUDGET', '0'))
+TOKEN_COUNT_MODE = os.getenv('TOKEN_COUNT_MODE', 'estimate')
+
+
+class TokenBudgetExceeded(Exception):
+    """A prompt does not fit the per-request limit or the run's remaining budget."""
+
+
+class TokenBudget:
+    """
+    Pre-flight prompt token counting with a per-request limit and a per-run budget.
+
+    Tokens are estimated locally, or counted by the backend when count_mode
+    is exact (falling back to the estimate if counting fails). Counts are
+    memoized by text, so a shared document prefix is counted once.
+    """
+
+    def __init__(self, max_prompt_tokens=GEMINI_MAX_PROMPT_TOKENS, run_budget=GEMINI_RUN_TOKEN_BUDGET,
+                 count_mode=TOKEN_COUNT_MODE, count_exact=None, memo_size=256):
+        if count_mode not in ("estimate", "exact"):
+            raise ValueError(f"Unknown TOKEN_COUNT_MODE: {count_mode}. Expected estimate or exact")
+        self.max_prompt_tokens = max_prompt_tokens
+        self.run_budget = run_budget
+        self.count_mode = count_mode
+        self.count_exact = count_exact
+        self.memo_size = memo_size
+        self._memo = OrderedDict()
+        self._lock = threading.Lock()
+        self.spent = {}
+        self.trimmed = 0
+        self.refused = 0
+
+    async def count(self, text):
+        """Return the prompt token count of text."""
+        key = hash_text(text)
+        if key in self._memo:
+            self._memo.move_to_end(key)
+            return self._memo[key]
+        tokens = None
+        if self.count_mode == "exact" and self.count_exact:
+            try:
+                tokens = await self.count_exact(text)
+            except Exception as e:
+                logger.warning(f"Exact token count failed, using estimate: {e}")
+        if tokens is None:
+            tokens = estimate_tokens(text)
+        self._memo[key] = tokens
+        while len(self._memo) > self.memo_size:
+            self._memo.popitem(last=False)
+        return tokens
+
+    def fits(self, tokens):
+        """Return True if a prompt of tokens is within the per-request limit."""
+        return tokens <= self.max_prompt_tokens
+
+    def record_trim(self):
+        with self._lock:
+            self.trimmed += 1
+
+    def refuse(self, message):
+        """Count a refused prompt and raise TokenBudgetExceeded."""
+        with self._lock:
+            self.refused += 1
+        logger.error(message)
+        raise TokenBudgetExceeded(message)
+
+    def charge(self, run_key, tokens):
+        """Charge tokens to run_key, refusing the call if it would exceed the run budget."""
+        with self._lock:
+            spent = self.spent.get(run_key, 0)
+            over_budget = self.run_budget and spent + tokens > self.run_budget
+            if not over_budget:
+                self.spent[run_key] = spent + tokens
+        if over_budget:
+            self.refuse(f"Run {run_key} has spent {spent} of {self.run_budget} prompt tokens, {tokens} more would exceed its budget")
+
+    def stats(self):
+        """Return the limits, prompts trimmed or refused and tokens spent per run."""
+        with self._lock:
+            return {
+                "countMode": self.count_mode,
+                "maxPromptTokens": self.max_prompt_tokens,
+                "runBudget": self.run_budget,
+                "trimmed": self.trimmed,
+                "refused": self.refused,
+                "spent": dict(self.spent)
+            }
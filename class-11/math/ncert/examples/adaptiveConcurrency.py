@@ -0,0 +1,128 @@
+import asyncio
+import logging
+import os
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+
+logger = logging.getLogger(__name__)
+
+GEMINI_MIN_CONCURRENCY = int(os.getenv('GEMINI_MIN_CONCURRENCY', '1'))
+GEMINI_INITIAL_CONCURRENCY = int(os.getenv('GEMINI_INITIAL_CONCURRENCY', '2'))
+GEMINI_LATENCY_TARGET_SECONDS = float(os.getenv('GEMINI_LATENCY_TARGET_SECONDS', '30'))
+GEMINI_MAX_ERROR_RATE = float(os.getenv('GEMINI_MAX_ERROR_RATE', '0.1'))
+GEMINI_BACKOFF_FACTOR = float(os.getenv('GEMINI_BACKOFF_FACTOR', '0.5'))
+
+THROTTLE_STATUS_CODES = (429, 503)
+
+
+def is_throttle_error(error):
+    """Return True for quota (429) and overload (503) errors from the API."""
+    code = getattr(error, 'code', None)
+    try:
+        return int(code) in THROTTLE_STATUS_CODES
+    except (TypeError, ValueError):
+        return False
+
+
+def percentile(values, fraction):
+    """Return the given percentile of values, or None if there are none."""
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+class AimdLimiter:
+    """
+    Additive-increase/multiplicative-decrease limit on in-flight calls.
+
+    The window grows by one slot per window's worth of healthy calls (latency
+    under target, recent error rate under max_error_rate) and is multiplied
+    by backoff_factor on each 429/503. Throttles from calls that started
+    before the last decrease do not shrink it again.
+    """
+
+    def __init__(self, max_window, min_window=GEMINI_MIN_CONCURRENCY, initial_window=GEMINI_INITIAL_CONCURRENCY,
+                 latency_target_seconds=GEMINI_LATENCY_TARGET_SECONDS, max_error_rate=GEMINI_MAX_ERROR_RATE,
+                 backoff_factor=GEMINI_BACKOFF_FACTOR, sample_size=500):
+        self.min_window = min_window
+        self.max_window = max(min_window, max_window)
+        self.window = float(min(max(initial_window, min_window), self.max_window))
+        self.latency_target_seconds = latency_target_seconds
+        self.max_error_rate = max_error_rate
+        self.backoff_factor = backoff_factor
+        self.in_flight = 0
+        self.latencies = deque(maxlen=sample_size)
+        self.outcomes = deque(maxlen=50)
+        self.successes = 0
+        self.errors = 0
+        self.throttle_events = 0
+        self.last_decrease_at = 0.0
+        self._condition = None
+
+    def _get_condition(self):
+        if self._condition is None:
+            self._condition = asyncio.Condition()
+        return self._condition
+
+    @asynccontextmanager
+    async def slot(self):
+        """Wait for room in the window and hold a slot for the duration of the block."""
+        condition = self._get_condition()
+        async with condition:
+            await condition.wait_for(lambda: self.in_flight < int(self.window))
+            self.in_flight += 1
+        started_at = time.monotonic()
+        try:
+            yield
+        except Exception as e:
+            self._on_error(e, started_at)
+            raise
+        else:
+            self._on_success(time.monotonic() - started_at)
+        finally:
+            async with condition:
+                self.in_flight -= 1
+                condition.notify_all()
+
+    def _error_rate(self):
+        return self.outcomes.count(False) / len(self.outcomes) if self.outcomes else 0.0
+
+    def _on_success(self, latency):
+        self.successes += 1
+        self.latencies.append(latency)
+        self.outcomes.append(True)
+        if latency <= self.latency_target_seconds and self._error_rate() <= self.max_error_rate:
+            self.window = min(self.max_window, self.window + 1.0 / self.window)
+
+    def _on_error(self, error, started_at):
+        self.errors += 1
+        self.outcomes.append(False)
+        if not is_throttle_error(error):
+            return
+        self.throttle_events += 1
+        if started_at < self.last_decrease_at:
+            return
+        previous_window = self.window
+        self.window = max(float(self.min_window), self.window * self.backoff_factor)
+        self.last_decrease_at = time.monotonic()
+        logger.warning(f"Gemini throttled ({error}), concurrency window {previous_window:.2f} -> {self.window:.2f}")
+
+    def stats(self):
+        """Return the current window, latency percentiles and error counters."""
+        latencies = list(self.latencies)
+        return {
+            "window": round(self.window, 2),
+            "maxWindow": self.max_window,
+            "inFlight": self.in_flight,
+            "latencySeconds": {
+                "p50": percentile(latencies, 0.5),
+                "p90": percentile(latencies, 0.9),
+                "p99": percentile(latencies, 0.99)
+            },
+            "successes": self.successes,
+            "errors": self.errors,
+            "throttleEvents": self.throttle_events,
+            "recentErrorRate": round(self._error_rate(), 4)
+        }
@@ -0,0 +1,108 @@
+import logging
+import os
+import threading
+import time
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+
+logger = logging.getLogger(__name__)
+
+# Hosts kept in the pool (read-pdf, login and question APIs) and keep-alive connections kept per host
+HTTP_POOL_HOSTS = int(os.getenv('HTTP_POOL_HOSTS', '8'))
+HTTP_POOL_MAXSIZE = int(os.getenv('HTTP_POOL_MAXSIZE', '16'))
+HTTP_CONNECT_TIMEOUT_SECONDS = float(os.getenv('HTTP_CONNECT_TIMEOUT_SECONDS', '5'))
+HTTP_READ_TIMEOUT_SECONDS = float(os.getenv('HTTP_READ_TIMEOUT_SECONDS', '60'))
+
+DEFAULT_PORTS = {"http": 80, "https": 443}
+
+
+def host_of(url):
+    """Return host:port of url, as the connection pools key it."""
+    parts = urlsplit(url)
+    return f"{parts.hostname}:{parts.port or DEFAULT_PORTS.get(parts.scheme)}"
+
+
+class HttpClient:
+    """
+    Shared keep-alive session for outbound HTTP calls.
+
+    Connections are pooled per host and reused across requests and threads.
+    Every request gets connect and read timeouts unless the caller passes its
+    own timeout. Async callers run it in the threadpool like other blocking I/O.
+    """
+
+    def __init__(self, pool_hosts=HTTP_POOL_HOSTS, pool_maxsize=HTTP_POOL_MAXSIZE,
+                 connect_timeout=HTTP_CONNECT_TIMEOUT_SECONDS, read_timeout=HTTP_READ_TIMEOUT_SECONDS):
+        self.timeout = (connect_timeout, read_timeout)
+        self.pool_maxsize = pool_maxsize
+        self.adapter = HTTPAdapter(pool_connections=pool_hosts, pool_maxsize=pool_maxsize)
+        self.session = requests.Session()
+        self.session.mount("http://", self.adapter)
+        self.session.mount("https://", self.adapter)
+        self._lock = threading.Lock()
+        self._hosts = {}
+
+    def request(self, method, url, **kwargs):
+        """Send a request through the pooled session and return the response."""
+        kwargs.setdefault("timeout", self.timeout)
+        host = host_of(url)
+        started_at = time.monotonic()
+        failed = True
+        try:
+            response = self.session.request(method, url, **kwargs)
+            failed = False
+            return response
+        finally:
+            self._record(host, time.monotonic() - started_at, failed)
+
+    def post(self, url, **kwargs):
+        return self.request("POST", url, **kwargs)
+
+    def put(self, url, **kwargs):
+        return self.request("PUT", url, **kwargs)
+
+    def _record(self, host, seconds, failed):
+        with self._lock:
+            host_stats = self._hosts.setdefault(host, {"requests": 0, "errors": 0, "seconds": 0.0})
+            host_stats["requests"] += 1
+            host_stats["errors"] += failed
+            host_stats["seconds"] += seconds
+
+    def _connections_opened(self):
+        """Return connections opened per host by the pools still held by the session."""
+        opened = {}
+        pools = self.adapter.poolmanager.pools
+        for key in pools.keys():
+            pool = pools.get(key)
+            if pool is not None:
+                host = f"{pool.host}:{pool.port}"
+                opened[host] = opened.get(host, 0) + pool.num_connections
+        return opened
+
+    def stats(self):
+        """Return requests, errors, latency, connections opened and connection reuse per host."""
+        opened = self._connections_opened()
+        with self._lock:
+            hosts = {host: dict(host_stats) for host, host_stats in self._hosts.items()}
+        result = {}
+        for host, host_stats in hosts.items():
+            connections = opened.get(host)
+            requests_sent = host_stats["requests"]
+            result[host] = {
+                "requests": requests_sent,
+                "errors": host_stats["errors"],
+                "averageSeconds": round(host_stats["seconds"] / requests_sent, 3),
+                "connectionsOpened": connections,
+                "reuseRatio": round(1 - connections / requests_sent, 3) if connections is not None else None
+            }
+        return {
+            "poolMaxsize": self.pool_maxsize,
+            "connectTimeoutSeconds": self.timeout[0],
+            "readTimeoutSeconds": self.timeout[1],
+            "hosts": result
+        }
+
+
+http_client = HttpClient()
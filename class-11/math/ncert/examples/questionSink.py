@@ -0,0 +1,182 @@
+import glob
+import gzip
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+
+from authToken import token_provider
+from httpClient import http_client
+
+logger = logging.getLogger(__name__)
+
+QUESTION_SINK = os.getenv('QUESTION_SINK', 'http')
+QUESTION_SINK_DIR = os.getenv('QUESTION_SINK_DIR', '.question_sink')
+# Compressed size at which the local sink starts a new file, and rotated files kept
+QUESTION_SINK_MAX_BYTES = int(os.getenv('QUESTION_SINK_MAX_BYTES', str(64 * 1024 * 1024)))
+QUESTION_SINK_MAX_FILES = int(os.getenv('QUESTION_SINK_MAX_FILES', '10'))
+
+
+def add_timing(timings, stage, started_at):
+    """Add the seconds since started_at to timings[stage] when timings are being collected."""
+    if timings is not None:
+        timings[stage] = timings.get(stage, 0.0) + time.monotonic() - started_at
+
+
+class QuestionSink:
+    """Base class for where created questions and their nextQuestionId links go."""
+
+    name = None
+
+    def create(self, question, timings=None, idempotency_key=None):
+        """Create question and return the response JSON, with the new id under data.id."""
+        raise NotImplementedError
+
+    def link(self, previous_question_id, next_question_id, timings=None):
+        """Set the nextQuestionId of previous_question_id."""
+        raise NotImplementedError
+
+    def stats(self):
+        return {"sink": self.name}
+
+
+class HttpQuestionSink(QuestionSink):
+    """Creates and links questions through the question API."""
+
+    name = "http"
+
+    def _question_url(self):
+        question_url = os.getenv('QUESTION_API_URL')
+        if not question_url:
+            raise Exception("Missing QUESTION_API_URL environment variable")
+        return question_url
+
+    def send_authorized(self, method, url, payload, stage, timings=None, extra_headers=None):
+        """
+        Send payload to url with the cached bearer token and return the response.
+
+        A 401 means the token was revoked or expired early: it is dropped and the
+        request is retried exactly once with a freshly logged in token.
+        """
+        for attempt in range(2):
+            started_at = time.monotonic()
+            token = token_provider.get_token()
+            add_timing(timings, "login", started_at)
+
+            headers = {
+                'Accept-Language': 'en',
+                'Timezone': 'Asia/Kolkata',
+                'Content-Type': 'application/json',
+                'Authorization': f'Bearer {token}',
+                **(extra_headers or {})
+            }
+            started_at = time.monotonic()
+            response = http_client.request(method, url, headers=headers, json=payload)
+            add_timing(timings, stage, started_at)
+            if response.status_code == 401 and attempt == 0:
+                token_provider.invalidate(token)
+                continue
+            response.raise_for_status()
+            return response
+
+    def create(self, question, timings=None, idempotency_key=None):
+        response = self.send_authorized(
+            'POST', self._question_url(), question, "create", timings,
+            {'Idempotency-Key': idempotency_key} if idempotency_key else None
+        )
+        return response.json()
+
+    def link(self, previous_question_id, next_question_id, timings=None):
+        update_url = f"{self._question_url()}/{previous_question_id}"
+        self.send_authorized('PUT', update_url, {"nextQuestionId": next_question_id}, "link", timings)
+
+
+class LocalQuestionSink(QuestionSink):
+    """
+    Appends questions and links to gzip-compressed JSONL files instead of
+    calling the question API, handing out local-<uuid> ids so the
+    previousQuestionId/nextQuestionId chaining still runs.
+
+    Each record is written as its own gzip member, so a file stays readable
+    (zcat, gzip.open) even if the process stops mid-run. questions.jsonl.gz
+    is rotated once it reaches max_bytes, keeping max_files rotated files.
+    """
+
+    name = "local"
+
+    def __init__(self, directory=QUESTION_SINK_DIR, max_bytes=QUESTION_SINK_MAX_BYTES, max_files=QUESTION_SINK_MAX_FILES):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.max_files = max_files
+        self.path = os.path.join(directory, "questions.jsonl.gz")
+        self._lock = threading.Lock()
+        self.created = 0
+        self.linked = 0
+        self.rotations = 0
+        os.makedirs(directory, exist_ok=True)
+
+    def _rotate(self):
+        rotated_path = os.path.join(self.directory, f"questions-{time.strftime('%Y%m%d-%H%M%S')}-{uuid.uuid4().hex[:6]}.jsonl.gz")
+        os.replace(self.path, rotated_path)
+        self.rotations += 1
+        logger.info(f"Rotated local question sink to {rotated_path}")
+        rotated = sorted(glob.glob(os.path.join(self.directory, "questions-*.jsonl.gz")), key=os.path.getmtime)
+        for old_path in rotated[:max(0, len(rotated) - self.max_files)]:
+            os.remove(old_path)
+
+    def _append(self, entry, stage, timings):
+        started_at = time.monotonic()
+        line = json.dumps(entry, ensure_ascii=False) + "\n"
+        with self._lock:
+            if os.path.exists(self.path) and os.path.getsize(self.path) >= self.max_bytes:
+                self._rotate()
+            with gzip.open(self.path, 'ab') as f:
+                f.write(line.encode('utf-8'))
+        add_timing(timings, stage, started_at)
+
+    def create(self, question, timings=None, idempotency_key=None):
+        question_id = f"local-{uuid.uuid4().hex}"
+        self._append({
+            "type": "create",
+            "id": question_id,
+            "idempotencyKey": idempotency_key,
+            "createdAt": time.time(),
+            "question": question
+        }, "create", timings)
+        self.created += 1
+        return {"data": {"id": question_id}}
+
+    def link(self, previous_question_id, next_question_id, timings=None):
+        self._append({
+            "type": "link",
+            "previousQuestionId": previous_question_id,
+            "nextQuestionId": next_question_id,
+            "createdAt": time.time()
+        }, "link", timings)
+        self.linked += 1
+
+    def stats(self):
+        return {
+            "sink": self.name,
+            "path": self.path,
+            "created": self.created,
+            "linked": self.linked,
+            "rotations": self.rotations
+        }
+
+
+QUESTION_SINKS = {
+    HttpQuestionSink.name: HttpQuestionSink,
+    LocalQuestionSink.name: LocalQuestionSink
+}
+
+
+def get_question_sink(name=QUESTION_SINK):
+    """Build the question sink selected by QUESTION_SINK (http or local)."""
+    if name not in QUESTION_SINKS:
+        raise ValueError(f"Unknown question sink: {name}. Expected one of {sorted(QUESTION_SINKS)}")
+    sink = QUESTION_SINKS[name]()
+    logger.info(f"Using {sink.name} question sink")
+    return sink
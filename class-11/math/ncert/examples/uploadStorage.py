@@ -0,0 +1,44 @@
+import logging
+import os
+import tempfile
+from contextlib import asynccontextmanager
+
+from fastapi.concurrency import run_in_threadpool
+
+logger = logging.getLogger(__name__)
+
+UPLOAD_TEMP_DIR = os.getenv('UPLOAD_TEMP_DIR') or None
+UPLOAD_CHUNK_SIZE = int(os.getenv('UPLOAD_CHUNK_SIZE', str(1024 * 1024)))
+
+
+def _remove_quietly(path):
+    try:
+        os.remove(path)
+        logger.info(f"Removed temporary file: {path}")
+    except FileNotFoundError:
+        pass
+    except Exception as e:
+        logger.error(f"Error removing temporary file {path}: {e}")
+
+
+@asynccontextmanager
+async def spooled_upload(upload_file, chunk_size=UPLOAD_CHUNK_SIZE):
+    """
+    Stream an UploadFile into a unique temporary file and yield its path.
+
+    The upload is copied chunk by chunk, with disk writes off the event loop,
+    so memory stays flat regardless of PDF size. The file is removed when
+    the block exits, including on errors.
+    """
+    fd, path = tempfile.mkstemp(prefix='upload_', suffix='.pdf', dir=UPLOAD_TEMP_DIR)
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            while True:
+                chunk = await upload_file.read(chunk_size)
+                if not chunk:
+                    break
+                await run_in_threadpool(f.write, chunk)
+        logger.info(f"Streamed upload {upload_file.filename} to {path}")
+        yield path
+    finally:
+        await run_in_threadpool(_remove_quietly, path)
@@ -0,0 +1,82 @@
+import json
+import logging
+import os
+import re
+import shutil
+import threading
+
+from pdfCache import hash_pdf_file
+
+logger = logging.getLogger(__name__)
+
+DOCUMENT_STORE_DIR = os.getenv('DOCUMENT_STORE_DIR', '.documents')
+
+_DOC_ID_PATTERN = re.compile(r'^[0-9a-f]{64}$')
+
+
+class Document:
+    """An uploaded PDF and its extracted text."""
+
+    def __init__(self, doc_id, filename, pdf_path, text):
+        self.doc_id = doc_id
+        self.filename = filename
+        self.pdf_path = pdf_path
+        self.text = text
+
+
+class DocumentStore:
+    """
+    Stores uploaded PDFs with their extracted text under store_dir.
+
+    Documents are content-addressed: the doc_id is the SHA-256 of the PDF
+    bytes, so uploading the same PDF again returns the same id.
+    """
+
+    def __init__(self, store_dir=DOCUMENT_STORE_DIR):
+        self.store_dir = store_dir
+        self._documents = {}
+        self._lock = threading.Lock()
+
+    def _document_dir(self, doc_id):
+        return os.path.join(self.store_dir, doc_id)
+
+    def save(self, filename, pdf_path, text):
+        """Copy the PDF at pdf_path into the store with its text and return the Document."""
+        doc_id = hash_pdf_file(pdf_path)
+        document_dir = self._document_dir(doc_id)
+        os.makedirs(document_dir, exist_ok=True)
+
+        stored_pdf_path = os.path.join(document_dir, 'document.pdf')
+        shutil.copyfile(pdf_path, stored_pdf_path)
+        with open(os.path.join(document_dir, 'text.txt'), 'w', encoding='utf-8') as f:
+            f.write(text)
+        with open(os.path.join(document_dir, 'meta.json'), 'w') as f:
+            json.dump({"doc_id": doc_id, "filename": filename}, f)
+
+        document = Document(doc_id, filename, stored_pdf_path, text)
+        with self._lock:
+            self._documents[doc_id] = document
+        logger.info(f"Stored document {doc_id} for {filename}")
+        return document
+
+    def get(self, doc_id):
+        """Return the Document for doc_id, or None if it is unknown."""
+        if not doc_id or not _DOC_ID_PATTERN.match(doc_id):
+            return None
+        with self._lock:
+            if doc_id in self._documents:
+                return self._documents[doc_id]
+
+        document_dir = self._document_dir(doc_id)
+        try:
+            with open(os.path.join(document_dir, 'meta.json'), 'r') as f:
+                meta = json.load(f)
+            with open(os.path.join(document_dir, 'text.txt'), 'r', encoding='utf-8') as f:
+                text = f.read()
+        except FileNotFoundError:
+            return None
+
+        document = Document(doc_id, meta.get('filename', ''), os.path.join(document_dir, 'document.pdf'), text)
+        with self._lock:
+            self._documents[doc_id] = document
+        return document
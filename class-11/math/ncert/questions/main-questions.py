@@ -1,6 +1,6 @@
 import requests
+import json
 import logging
-import time
 from pathlib import Path
 
 # Configure logging
@@ -27,47 +27,39 @@ POSTED_BY_USER_ID = "6810b82fb49f7e3b1f0460ea"
 BOARD = "CBSE"
 SOURCE = "NCERT Maths"
 
-def call_process_pdf_api(attempt):
-    """Call the process_pdf API with the given attempt number."""
+PDF_FILE_NAME = 'class-11-ex-8.1.pdf'
+PDF_FILE_PATH = '../book/ch-8/ex-8.1.pdf'
+
+def upload_document():
+    """Upload the PDF once and return its document id."""
+    try:
+        url = "http://localhost:8000/documents"
+        with open(PDF_FILE_PATH, 'rb') as pdf_file:
+            files = {
+                'pdf_file': (PDF_FILE_NAME, pdf_file, 'application/pdf')
+            }
+            response = requests.post(url, files=files)
+        response.raise_for_status()
+        doc_id = response.json()['doc_id']
+        logger.info(f"Uploaded {PDF_FILE_PATH} as document {doc_id}")
+        return doc_id
+    except Exception as e:
+        logger.error(f"Document upload failed, PDF will be sent with every call: {e}")
+        return None
+
+def call_process_pdf_api(attempt, doc_id=None):
+    """Call the process_pdf API with the given attempt number, referencing doc_id when available."""
     try:
         url = "http://localhost:8000/process_pdf"     
         
         # Form data
-        files = {
-            'pdf_file': ('class-11-ex-8.1.pdf', open('../book/ch-8/ex-8.1.pdf', 'rb'), 'application/pdf')
-        }
+        files = {}
+        if not doc_id:
+            files['pdf_file'] = (PDF_FILE_NAME, open(PDF_FILE_PATH, 'rb'), 'application/pdf')
         
         data = {
-            'prompt': f"""You are a professional mathematics teacher of {CLASS_NAME}.
-                    You need to solve questions provied in the Exercise {EXERCISE_NUMBER}.
-
-                    Title in en language must be exact same as question in PDF file.
-                    Write solution for the each question considering level of {CLASS_NAME}.
-                    Write explanation of the solution.
-                    Make sure that solution should not look like AI generated.
-                    DifficultyLevelCode should EASY, MEDIUM, HARD. Provide best suggestion.
-                    Must use latex in title, solution and explanation. Use LaTeX format Inline math expressions using $...$
-                    Add next line, double next line, paragraph etc whatever and wherever best applicable for the student in title, solution and explanation. Don't use markup in title, solution and explanation.
-                    title, solution, explanation must be created for English (en) language only.
-                    englishTitle should be same as title.
-                    Don't use latex in englishTitle and solutionWOLatex. englishTitle and solutionWOLatex should be in plain text.
-                    Please make sure that response must be in XML format.
-                    Do not provide 'Explanation of the Code and Choices' in the response.
-                    Do not provide 'Important Considerations' in the response.
-                    Provide only one question in the response.
-                    Create response in the following XML format.
-
-                    Sample xml response:
-                    <question>
-                        <title> <en><![CDATA[question here]]></en> </title>
-                        <englishTitle><![CDATA[question here]]></englishTitle>
-                        <solution> <en><![CDATA[solution here]]></en> </solution>
-                        <solutionWOLatex> <en><![CDATA[solution here]]></en> </solutionWOLatex>
-                        <explanation> <en><![CDATA[explanation here]]></en> </explanation>
-                        <difficultyLevelCode><difficulty level></difficultyLevelCode>
-                        <questionNo>Example <exampleNo></questionNo>
-                    </question>
-                """,
+            'promptTemplateId': 'questions',
+            'promptParams': json.dumps({'class_name': CLASS_NAME, 'mode': 'exercise', 'exercise_number': EXERCISE_NUMBER}),
                     'status': STATUS,
                     'gradeCode': GRADE_CODE,
                     'subjectCode': SUBJECT_CODE,
@@ -79,6 +71,9 @@ def call_process_pdf_api(attempt):
                     'exerciseCode': EXERCISE_CODE
 }
         
+        if doc_id:
+            data['doc_id'] = doc_id
+
         logger.info(f"Attempt {attempt}: Calling process_pdf API")
         response = requests.post(url, files=files, data=data)
         response.raise_for_status()
@@ -97,25 +92,22 @@ def call_process_pdf_api(attempt):
         return None
     finally:
         # Close the file if it was opened
-        if 'files' in locals():
+        if 'files' in locals() and 'pdf_file' in files:
             files['pdf_file'][1].close()
 
 def main():
     """Main function to call the API 10 times."""
     logger.info("Starting API calls")
+    doc_id = upload_document()
     
     for i in range(1, 50):
         logger.info(f"Starting attempt {i} of 50")
-        result = call_process_pdf_api(i)    
+        result = call_process_pdf_api(i, doc_id)    
         
         if result:
             logger.info(f"Attempt {i}: Successfully processed response")
         else:
             logger.error(f"Attempt {i}: Failed to process response")
-        
-        if i < 50:  # Don't wait after the last call
-            logger.info(f"Waiting before next attempt...")
-            time.sleep(10)  # 10 second delay between calls
     
     logger.info("Completed all API calls")
 
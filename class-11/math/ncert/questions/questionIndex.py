@@ -0,0 +1,147 @@
+import logging
+import os
+import re
+import threading
+from functools import lru_cache
+
+logger = logging.getLogger(__name__)
+
+QUESTION_CONTEXT_CHARS = int(os.getenv('QUESTION_CONTEXT_CHARS', '300'))
+CHARS_PER_TOKEN = 4
+
+EXAMPLE_MARKER = re.compile(r'^\s*Example\s+(\d+)\b', re.IGNORECASE | re.MULTILINE)
+# Question marker styles in order of preference. Bare "7." markers also
+# match numbered solution steps, so they are used only when a PDF has no
+# "Q7" markers.
+QUESTION_MARKERS = [
+    re.compile(r'^\s*Q\.?\s*(\d+)\b', re.MULTILINE),
+    re.compile(r'^\s*(\d+)\s*[.)](?!\d)', re.MULTILINE)
+]
+# Questions are looked for only after the exercise heading, up to the next section heading
+EXERCISE_HEADING = re.compile(r'^\s*(?:EXERCISE\s+\d+(?:\.\d+)?|Miscellaneous\s+Exercise\b.*)\s*$', re.MULTILINE)
+SECTION_HEADING = re.compile(r'^\s*\d+\.\d+\s+[A-Z][a-z]', re.MULTILINE)
+
+
+def estimate_tokens(text):
+    """Rough token estimate used for reporting savings."""
+    return len(text) // CHARS_PER_TOKEN
+
+
+class QuestionIndex:
+    """
+    Splits extracted PDF text into segments keyed by question/example number.
+
+    mode is "examples" (Example N headings anywhere in the text) or
+    "questions" (numbered questions after the EXERCISE / Miscellaneous
+    Exercise heading, so worked examples ahead of the exercise are never
+    taken for questions). Markers are taken while their numbers keep
+    increasing; stray lower or repeated numbers inside solutions are skipped.
+    Numbers the markers skip over (e.g. "Example 11" extracted as
+    "Example 1 1") are left out of the index, so their segment is the
+    preceding one, which still contains them, and a lookup that asks for
+    them falls back to the full text. More than one exercise heading makes
+    the index empty.
+    """
+
+    def __init__(self, text, mode="questions", context_chars=QUESTION_CONTEXT_CHARS):
+        if mode not in ("questions", "examples"):
+            raise ValueError(f"Unknown question index mode: {mode}. Expected questions or examples")
+        self.text = text
+        self.mode = mode
+        self.context_chars = context_chars
+        self.spans = self._build_spans(text)
+
+    def _build_spans(self, text):
+        if self.mode == "examples":
+            return self._sequence_spans(EXAMPLE_MARKER, text, 0, len(text))
+
+        headings = list(EXERCISE_HEADING.finditer(text))
+        if len(headings) > 1:
+            logger.warning(f"Found {len(headings)} exercise headings, not indexing questions")
+            return {}
+        start, end = 0, len(text)
+        if headings:
+            start = headings[0].end()
+            section = SECTION_HEADING.search(text, start)
+            end = section.start() if section else len(text)
+        for pattern in QUESTION_MARKERS:
+            spans = self._sequence_spans(pattern, text, start, end)
+            if spans:
+                return spans
+        return {}
+
+    def _sequence_spans(self, pattern, text, start, end):
+        """Return {number: (start, end)} for the increasing markers of pattern in text[start:end]."""
+        markers = []
+        for match in pattern.finditer(text, start, end):
+            number = int(match.group(1))
+            if not markers or number > markers[-1][0]:
+                if markers and number > markers[-1][0] + 1:
+                    logger.info(f"Marker {number} follows {markers[-1][0]}, numbers in between are not indexed")
+                markers.append((number, match.start()))
+        spans = {}
+        for i, (number, marker_start) in enumerate(markers):
+            marker_end = markers[i + 1][1] if i + 1 < len(markers) else end
+            spans[str(number)] = (marker_start, marker_end)
+        return spans
+
+    def covers(self, question_numbers):
+        """Return True if every one of question_numbers has a segment."""
+        return bool(question_numbers) and all(str(number).strip() in self.spans for number in question_numbers)
+
+    def segment_for_many(self, question_numbers, context_chars=None):
+        """
+        Return the text covering all question_numbers plus a small context window.
+
+        Falls back to the full text when any question is not in the index.
+        """
+        context_chars = self.context_chars if context_chars is None else context_chars
+        if not self.covers(question_numbers):
+            return self.text
+        spans = [self.spans[str(number).strip()] for number in question_numbers]
+        start = max(0, min(span[0] for span in spans) - context_chars)
+        end = min(len(self.text), max(span[1] for span in spans) + context_chars)
+        return self.text[start:end]
+
+
+@lru_cache(maxsize=32)
+def get_question_index(text, mode="questions"):
+    """Return the index for text, building it once per distinct PDF text and mode."""
+    index = QuestionIndex(text, mode)
+    logger.info(f"Built question index with {len(index.spans)} segments")
+    return index
+
+
+class TokenSavings:
+    """Tracks estimated prompt tokens saved by sending segments instead of full text."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.calls = 0
+        self.full_tokens = 0
+        self.segment_tokens = 0
+
+    def record(self, full_text, segment_text):
+        """Record one call and return its estimated savings."""
+        full_tokens = estimate_tokens(full_text)
+        segment_tokens = estimate_tokens(segment_text)
+        with self._lock:
+            self.calls += 1
+            self.full_tokens += full_tokens
+            self.segment_tokens += segment_tokens
+        return {
+            "fullTokens": full_tokens,
+            "segmentTokens": segment_tokens,
+            "savedTokens": full_tokens - segment_tokens
+        }
+
+    def stats(self):
+        """Return cumulative savings for this process."""
+        with self._lock:
+            return {
+                "calls": self.calls,
+                "fullTokens": self.full_tokens,
+                "segmentTokens": self.segment_tokens,
+                "savedTokens": self.full_tokens - self.segment_tokens,
+                "savedRatio": round(1 - self.segment_tokens / self.full_tokens, 4) if self.full_tokens else 0.0
+            }
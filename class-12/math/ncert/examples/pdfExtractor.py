@@ -0,0 +1,164 @@
+import logging
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+import PyPDF2
+
+from httpClient import http_client
+from pdfOcr import OCR_VERSION, PDF_OCR_ENABLED, OcrFallback
+
+logger = logging.getLogger(__name__)
+
+PDF_EXTRACTOR = os.getenv('PDF_EXTRACTOR', 'local')
+PDF_API_URL = os.getenv('PDF_API_URL', 'http://localhost:5000/read-pdf')
+PDF_EXTRACT_WORKERS = int(os.getenv('PDF_EXTRACT_WORKERS', str(os.cpu_count() or 1)))
+PDF_PARALLEL_MIN_PAGES = int(os.getenv('PDF_PARALLEL_MIN_PAGES', '8'))
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def get_process_pool(max_workers=PDF_EXTRACT_WORKERS):
+    """Return the shared process pool, creating it on first use."""
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ProcessPoolExecutor(max_workers=max_workers)
+            logger.info(f"Started PDF extraction process pool with {max_workers} workers")
+        return _executor
+
+
+def split_page_ranges(page_count, parts):
+    """Split page_count pages into at most parts contiguous (start, end) ranges."""
+    parts = max(1, min(parts, page_count))
+    size, remainder = divmod(page_count, parts)
+    ranges = []
+    start = 0
+    for i in range(parts):
+        end = start + size + (1 if i < remainder else 0)
+        ranges.append((start, end))
+        start = end
+    return ranges
+
+
+def extract_page_range(pdf_path, start, end):
+    """Extract the text of pages [start, end) of a PDF. Runs in pool workers."""
+    with open(pdf_path, 'rb') as f:
+        reader = PyPDF2.PdfReader(f)
+        return [reader.pages[i].extract_text() or '' for i in range(start, end)]
+
+
+class PdfExtractor:
+    """Base class for PDF text extraction backends."""
+
+    name = "base"
+    version = "v0"
+
+    def extract(self, pdf_path):
+        """Return the text content of the PDF at pdf_path."""
+        raise NotImplementedError
+
+
+class LocalPdfExtractor(PdfExtractor):
+    """
+    Extracts text in-process with PyPDF2.
+
+    PDFs with at least min_parallel_pages pages are split into page ranges
+    that are extracted across the shared process pool and joined in page order.
+    When OCR is enabled, pages with an empty or garbled text layer are OCR'd.
+    """
+
+    name = "local"
+
+    def __init__(self, workers=PDF_EXTRACT_WORKERS, min_parallel_pages=PDF_PARALLEL_MIN_PAGES, ocr=PDF_OCR_ENABLED):
+        self.workers = workers
+        self.min_parallel_pages = min_parallel_pages
+        self.ocr_fallback = OcrFallback() if ocr else None
+        self.version = f"pypdf2-{PyPDF2.__version__}" + (f"+{OCR_VERSION}" if ocr else "")
+
+    def extract(self, pdf_path):
+        with open(pdf_path, 'rb') as f:
+            page_count = len(PyPDF2.PdfReader(f).pages)
+
+        if self.workers > 1 and page_count >= self.min_parallel_pages:
+            ranges = split_page_ranges(page_count, self.workers)
+            pool = get_process_pool(self.workers)
+            futures = [pool.submit(extract_page_range, pdf_path, start, end) for start, end in ranges]
+            pages = [page for future in futures for page in future.result()]
+            logger.info(f"Extracted {page_count} pages in {len(ranges)} parallel ranges from PDF: {pdf_path}")
+        else:
+            pages = extract_page_range(pdf_path, 0, page_count)
+            logger.info(f"Extracted {page_count} pages locally from PDF: {pdf_path}")
+
+        if self.ocr_fallback:
+            pages = self.ocr_fallback.repair(pdf_path, pages, get_process_pool(self.workers))
+        return "\n".join(pages)
+
+
+class RemotePdfExtractor(PdfExtractor):
+    """Extracts text by calling the external /read-pdf service."""
+
+    name = "remote"
+    version = "read-pdf-v1"
+
+    def __init__(self, url=PDF_API_URL):
+        self.url = url
+
+    def extract(self, pdf_path):
+        headers = {
+            'x-api-key': os.getenv('PDF_API_KEY', '')  # Get API key from environment variable
+        }
+
+        with open(pdf_path, 'rb') as pdf_file:
+            files = {
+                'file': (os.path.basename(pdf_path), pdf_file, 'application/pdf')
+            }
+            response = http_client.post(self.url, headers=headers, files=files)
+            response.raise_for_status()
+
+        result = response.json()
+        if not result.get('success'):
+            raise Exception("PDF text extraction failed")
+        logger.info(f"Extracted text remotely from PDF: {pdf_path}")
+        return result.get('text', '')
+
+
+class FallbackPdfExtractor(PdfExtractor):
+    """Tries the primary backend and falls back when it fails or returns no text."""
+
+    def __init__(self, primary, fallback):
+        self.primary = primary
+        self.fallback = fallback
+        self.name = f"{primary.name}+{fallback.name}"
+        self.version = f"{primary.version}+{fallback.version}"
+
+    def extract(self, pdf_path):
+        try:
+            text = self.primary.extract(pdf_path)
+            if text.strip():
+                return text
+            logger.warning(f"{self.primary.name} extractor returned no text for {pdf_path}, falling back to {self.fallback.name}")
+        except Exception as e:
+            logger.warning(f"{self.primary.name} extractor failed for {pdf_path}: {e}, falling back to {self.fallback.name}")
+        return self.fallback.extract(pdf_path)
+
+
+EXTRACTORS = {
+    LocalPdfExtractor.name: LocalPdfExtractor,
+    RemotePdfExtractor.name: RemotePdfExtractor
+}
+
+
+def get_pdf_extractor(name=PDF_EXTRACTOR):
+    """
+    Build the extractor selected for this deployment.
+
+    "local" uses PyPDF2 with the remote service as fallback, "remote" uses
+    the /read-pdf service only.
+    """
+    if name not in EXTRACTORS:
+        raise ValueError(f"Unknown PDF extractor: {name}. Expected one of {sorted(EXTRACTORS)}")
+    if name == RemotePdfExtractor.name:
+        return RemotePdfExtractor()
+    return FallbackPdfExtractor(EXTRACTORS[name](), RemotePdfExtractor())
@@ -0,0 +1,176 @@
+import logging
+import string
+from functools import lru_cache
+
+from responseCache import hash_text
+
+logger = logging.getLogger(__name__)
+
+SAMPLE_XML_RESPONSE = """Sample xml response:
+<question>
+    <title> <en><![CDATA[question here]]></en> </title>
+    <englishTitle><![CDATA[question here]]></englishTitle>
+    <solution> <en><![CDATA[solution here]]></en> </solution>
+    <solutionWOLatex> <en><![CDATA[solution here]]></en> </solutionWOLatex>
+    <explanation> <en><![CDATA[explanation here]]></en> </explanation>
+    <difficultyLevelCode><difficulty level></difficultyLevelCode>
+    <questionNo>Example <exampleNo></questionNo>
+</question>"""
+
+QUESTIONS_INSTRUCTIONS_V1 = f"""Title in en language must be exact same as question in PDF file.
+Write explanation of the solution.
+Make sure that solution should not look like AI generated.
+DifficultyLevelCode should EASY, MEDIUM, HARD. Provide best suggestion.
+Must use latex in title, solution and explanation. Use LaTeX format Inline math expressions using $...$
+Add next line, double next line, paragraph etc whatever and wherever best applicable for the student in title, solution and explanation. Don't use markup in title, solution and explanation.
+title, solution, explanation must be created for English (en) language only.
+englishTitle should be same as title.
+Don't use latex in englishTitle and solutionWOLatex. englishTitle and solutionWOLatex should be in plain text.
+Please make sure that response must be in XML format.
+Do not provide 'Explanation of the Code and Choices' in the response.
+Do not provide 'Important Considerations' in the response.
+Provide only one question in the response.
+Create response in the following XML format.
+
+{SAMPLE_XML_RESPONSE}"""
+
+QUESTIONS_CONTEXT_V1 = """You are a professional mathematics teacher of {class_name}.
+You need to solve questions provided in the {scope}.
+Write solution for the each question considering level of {class_name}."""
+
+EXAMPLES_INSTRUCTIONS_V1 = f"""Read example and its solution from attached PDF file.
+Title and solution in en language must be exacted same as in PDF file.
+Example has its solution just after the example. Use that solution rather than creating your own solution.
+Write explanation of the solution.
+Make sure that solution should not look like AI generated.
+DifficultyLevelCode should EASY, MEDIUM, HARD. Provide best suggestion.
+Don't use latex in englishTitle and solutionWOLatex. englishTitle and solutionWOLatex should be in plain text.
+englishTitle should be picked from title.
+Must use latex in title, solution and explanation. Use LaTeX format Inline math expressions using $...$
+Do not provide 'Explanation of the Code and Choices' in the response.
+Do not provide 'Important Considerations' in the response.
+Don't use markup symbols in title, solution and explanation.
+Add next line, double next line, paragraph etc whatever and wherever best applicable for the student in title, solution and explanation.
+title, solution, explanation must be created for English (en) language only.
+Read and respond only one example at a time.
+Only examples should be read and responded. For example, Example 1, Example 2, Example 3, etc.
+Response must be XML only. Create response in the following format.
+
+{SAMPLE_XML_RESPONSE}"""
+
+EXAMPLES_CONTEXT_V1 = """You are a professional mathematics teacher of {class_name}."""
+
+
+def template_fields(text):
+    """Return the names of the {placeholders} in text."""
+    return {field for _, field, _, _ in string.Formatter().parse(text) if field}
+
+
+class PromptTemplate:
+    """
+    A versioned prompt: static instructions followed by a short context
+    rendered from parameters.
+
+    The instructions take no parameters and come first, so every request
+    shares the same prompt prefix whatever the class or exercise. modes map
+    a mode parameter to the {scope} text, itself rendered from parameters.
+    """
+
+    def __init__(self, template_id, version, instructions, context, modes=None, default_mode=None):
+        if template_fields(instructions):
+            raise ValueError(f"Instructions of prompt template {template_id}@{version} must not take parameters")
+        self.template_id = template_id
+        self.version = version
+        self.instructions = instructions
+        self.context = context
+        self.modes = modes or {}
+        self.default_mode = default_mode
+        self.parameters = sorted(
+            (template_fields(context) - {"scope"}).union(*(template_fields(scope) for scope in self.modes.values()))
+        )
+
+    def render(self, params):
+        """Return the prompt text for params, raising ValueError for a bad mode or missing parameter."""
+        values = dict(params)
+        if self.modes:
+            mode = values.pop("mode", None) or self.default_mode
+            if mode not in self.modes:
+                raise ValueError(f"Unknown mode {mode} for prompt template {self.template_id}. Expected one of {sorted(self.modes)}")
+            try:
+                values["scope"] = self.modes[mode].format(**values)
+            except KeyError as e:
+                raise ValueError(f"Missing parameter {e} for mode {mode} of prompt template {self.template_id}")
+        try:
+            context = self.context.format(**values)
+        except KeyError as e:
+            raise ValueError(f"Missing parameter {e} for prompt template {self.template_id}")
+        return f"{self.instructions}\n\n{context}"
+
+    def describe(self):
+        return {
+            "id": self.template_id,
+            "version": self.version,
+            "parameters": self.parameters,
+            "modes": sorted(self.modes),
+            "defaultMode": self.default_mode
+        }
+
+
+class PromptTemplateRegistry:
+    """
+    Versioned prompt templates referenced by id, version and parameters.
+
+    Rendered prompts are memoized per (id, version, parameters), along with
+    the prompt version used in cache keys and output records.
+    """
+
+    def __init__(self, templates=()):
+        self._templates = {}
+        self._latest = {}
+        for template in templates:
+            self.register(template)
+
+    def register(self, template):
+        key = (template.template_id, template.version)
+        if key in self._templates:
+            raise ValueError(f"Prompt template {template.template_id}@{template.version} is already registered")
+        self._templates[key] = template
+        self._latest[template.template_id] = template.version
+        self.render.cache_clear()
+        logger.info(f"Registered prompt template {template.template_id}@{template.version}")
+
+    def get(self, template_id, version=None):
+        """Return the template, the latest version unless version is given."""
+        template = self._templates.get((template_id, version or self._latest.get(template_id)))
+        if template is None:
+            raise ValueError(f"Unknown prompt template {template_id}" + (f"@{version}" if version else ""))
+        return template
+
+    @lru_cache(maxsize=256)
+    def render(self, template_id, version, params):
+        """
+        Return (prompt, prompt_version) for params, a tuple of sorted (name, value) pairs.
+
+        prompt_version names the template version and a short hash of the
+        rendered text, so different parameters never share a cache entry.
+        """
+        template = self.get(template_id, version)
+        prompt = template.render(params)
+        return prompt, f"{template.template_id}@{template.version}/{hash_text(prompt)[:12]}"
+
+    def describe(self):
+        """Return every registered template with its parameters, latest version first per id."""
+        return [self._templates[key].describe() for key in sorted(self._templates, key=lambda key: (key[0], key[1] != self._latest[key[0]], key[1]))]
+
+
+prompt_templates = PromptTemplateRegistry([
+    PromptTemplate(
+        "questions", "v1", QUESTIONS_INSTRUCTIONS_V1, QUESTIONS_CONTEXT_V1,
+        modes={
+            "exercise": "Exercise {exercise_number}",
+            "miscellaneous": "Miscellaneous Exercise on Chapter {chapter_number}"
+        },
+        default_mode="exercise"
+    ),
+    PromptTemplate("examples", "v1", EXAMPLES_INSTRUCTIONS_V1, EXAMPLES_CONTEXT_V1)
+])
@@ -0,0 +1,291 @@
+import asyncio
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+
+from fastapi.concurrency import run_in_threadpool
+
+from responseCache import hash_text
+
+logger = logging.getLogger(__name__)
+
+QUESTION_OUTBOX_ENABLED = os.getenv('QUESTION_OUTBOX_ENABLED', 'false').lower() == 'true'
+QUESTION_OUTBOX_PATH = os.getenv('QUESTION_OUTBOX_PATH', '.question_outbox.sqlite3')
+QUESTION_OUTBOX_MAX_ATTEMPTS = int(os.getenv('QUESTION_OUTBOX_MAX_ATTEMPTS', '10'))
+QUESTION_OUTBOX_RETRY_BASE_SECONDS = float(os.getenv('QUESTION_OUTBOX_RETRY_BASE_SECONDS', '2'))
+QUESTION_OUTBOX_RETRY_MAX_SECONDS = float(os.getenv('QUESTION_OUTBOX_RETRY_MAX_SECONDS', '300'))
+# How often the dispatcher looks for new entries when it is not woken up
+QUESTION_OUTBOX_POLL_SECONDS = float(os.getenv('QUESTION_OUTBOX_POLL_SECONDS', '5'))
+# How long /process_pdf waits for the outbox to drain before stopping at the end of an exercise
+QUESTION_OUTBOX_DRAIN_SECONDS = float(os.getenv('QUESTION_OUTBOX_DRAIN_SECONDS', '60'))
+
+
+def is_permanent_error(error):
+    """Return True for client errors that retrying the same payload cannot fix."""
+    status_code = getattr(getattr(error, 'response', None), 'status_code', None)
+    return status_code is not None and 400 <= status_code < 500 and status_code not in (401, 408, 409, 429)
+
+
+class QuestionOutbox:
+    """
+    SQLite outbox of formatted questions waiting to be created downstream.
+
+    Entries are appended before any downstream call and keyed by an
+    idempotency key derived from the payload, so appending the same question
+    twice keeps one entry. Entries are dispatched in append order; failures
+    are retried with exponential backoff and entries that keep failing, or
+    are rejected outright, are marked dead until requeued.
+
+    An entry is pending until its question is created, then created, with
+    the new question id stored, until it is linked to the previous question,
+    and then sent. Retrying a created entry only links it again.
+    """
+
+    def __init__(self, path=QUESTION_OUTBOX_PATH, enabled=QUESTION_OUTBOX_ENABLED, max_attempts=QUESTION_OUTBOX_MAX_ATTEMPTS,
+                 retry_base_seconds=QUESTION_OUTBOX_RETRY_BASE_SECONDS, retry_max_seconds=QUESTION_OUTBOX_RETRY_MAX_SECONDS):
+        self.path = path
+        self.enabled = enabled
+        self.max_attempts = max_attempts
+        self.retry_base_seconds = retry_base_seconds
+        self.retry_max_seconds = retry_max_seconds
+        self._lock = threading.Lock()
+        if self.enabled:
+            with self._connect() as conn:
+                conn.execute(
+                    "CREATE TABLE IF NOT EXISTS outbox ("
+                    "id INTEGER PRIMARY KEY AUTOINCREMENT, idempotency_key TEXT NOT NULL UNIQUE, "
+                    "prompt_version TEXT, payload TEXT NOT NULL, status TEXT NOT NULL, "
+                    "attempts INTEGER NOT NULL DEFAULT 0, next_attempt_at REAL NOT NULL, last_error TEXT, "
+                    "question_id TEXT, previous_question_id TEXT, created_at REAL NOT NULL, updated_at REAL NOT NULL)"
+                )
+                columns = [row[1] for row in conn.execute("PRAGMA table_info(outbox)")]
+                if "previous_question_id" not in columns:
+                    conn.execute("ALTER TABLE outbox ADD COLUMN previous_question_id TEXT")
+                conn.execute("CREATE INDEX IF NOT EXISTS outbox_status ON outbox (status, id)")
+
+    def _connect(self):
+        return sqlite3.connect(self.path, timeout=30)
+
+    @staticmethod
+    def idempotency_key(payload):
+        return hash_text(json.dumps(payload, sort_keys=True))
+
+    def append(self, payload, prompt_version=None):
+        """Store payload durably and return its entry as {"outboxId", "idempotencyKey", "status"}."""
+        key = self.idempotency_key(payload)
+        now = time.time()
+        with self._lock, self._connect() as conn:
+            conn.execute(
+                "INSERT OR IGNORE INTO outbox (idempotency_key, prompt_version, payload, status, next_attempt_at, created_at, updated_at) "
+                "VALUES (?, ?, ?, 'pending', ?, ?, ?)",
+                (key, prompt_version, json.dumps(payload), now, now, now)
+            )
+            outbox_id, status = conn.execute("SELECT id, status FROM outbox WHERE idempotency_key = ?", (key,)).fetchone()
+        logger.info(f"Question queued in outbox as entry {outbox_id} ({status})")
+        return {"outboxId": outbox_id, "idempotencyKey": key, "status": status}
+
+    def next_pending(self):
+        """
+        Return the oldest pending or created entry as (id, key, payload, attempts,
+        next_attempt_at, created), or None. created is (question_id, previous_question_id)
+        once the question has been created, otherwise None.
+        """
+        with self._lock, self._connect() as conn:
+            row = conn.execute(
+                "SELECT id, idempotency_key, payload, attempts, next_attempt_at, status, question_id, previous_question_id FROM outbox "
+                "WHERE status IN ('pending', 'created') ORDER BY id LIMIT 1"
+            ).fetchone()
+        if row is None:
+            return None
+        outbox_id, key, payload, attempts, next_attempt_at, status, question_id, previous_question_id = row
+        created = (question_id, previous_question_id) if status == 'created' else None
+        return outbox_id, key, json.loads(payload), attempts, next_attempt_at, created
+
+    def mark_created(self, outbox_id, question_id, previous_question_id):
+        """Record that the entry's question was created, so a retry only links it."""
+        with self._lock, self._connect() as conn:
+            conn.execute(
+                "UPDATE outbox SET status = 'created', question_id = ?, previous_question_id = ?, updated_at = ? WHERE id = ?",
+                (question_id, previous_question_id, time.time(), outbox_id)
+            )
+
+    def mark_sent(self, outbox_id, question_id):
+        with self._lock, self._connect() as conn:
+            conn.execute(
+                "UPDATE outbox SET status = 'sent', attempts = attempts + 1, question_id = ?, last_error = NULL, updated_at = ? WHERE id = ?",
+                (question_id, time.time(), outbox_id)
+            )
+
+    def mark_failed(self, outbox_id, attempts, error):
+        """Schedule a retry with exponential backoff, or mark the entry dead. Return the new status."""
+        attempts += 1
+        dead = attempts >= self.max_attempts or is_permanent_error(error)
+        delay = min(self.retry_max_seconds, self.retry_base_seconds * 2 ** (attempts - 1))
+        now = time.time()
+        with self._lock, self._connect() as conn:
+            # An entry whose question was already created stays created
+            conn.execute(
+                "UPDATE outbox SET status = CASE WHEN ? THEN 'dead' WHEN question_id IS NOT NULL THEN 'created' ELSE 'pending' END, "
+                "attempts = ?, next_attempt_at = ?, last_error = ?, updated_at = ? WHERE id = ?",
+                (dead, attempts, now + delay, str(error)[:500], now, outbox_id)
+            )
+            return conn.execute("SELECT status FROM outbox WHERE id = ?", (outbox_id,)).fetchone()[0]
+
+    def requeue_dead(self):
+        """Make dead entries pending, or created if their question exists, again and return how many were requeued."""
+        now = time.time()
+        with self._lock, self._connect() as conn:
+            cursor = conn.execute(
+                "UPDATE outbox SET status = CASE WHEN question_id IS NOT NULL THEN 'created' ELSE 'pending' END, "
+                "attempts = 0, next_attempt_at = ?, updated_at = ? WHERE status = 'dead'",
+                (now, now)
+            )
+            return cursor.rowcount
+
+    def dead_entries(self, limit=100):
+        """
+        Return the dead entries, oldest first. Those with a questionId were created
+        but never linked to their previousQuestionId, and are missing from the chain.
+        """
+        if not self.enabled:
+            return []
+        with self._lock, self._connect() as conn:
+            rows = conn.execute(
+                "SELECT id, idempotency_key, attempts, last_error, question_id, previous_question_id, updated_at FROM outbox "
+                "WHERE status = 'dead' ORDER BY id LIMIT ?",
+                (limit,)
+            ).fetchall()
+        return [
+            {
+                "outboxId": outbox_id,
+                "idempotencyKey": key,
+                "attempts": attempts,
+                "lastError": last_error,
+                "questionId": question_id,
+                "previousQuestionId": previous_question_id,
+                "updatedAt": updated_at
+            }
+            for outbox_id, key, attempts, last_error, question_id, previous_question_id, updated_at in rows
+        ]
+
+    def stats(self):
+        """Return entries per status and the age of the oldest pending entry."""
+        if not self.enabled:
+            return {"enabled": False}
+        with self._lock, self._connect() as conn:
+            counts = dict(conn.execute("SELECT status, COUNT(*) FROM outbox GROUP BY status").fetchall())
+            oldest = conn.execute("SELECT MIN(created_at) FROM outbox WHERE status IN ('pending', 'created')").fetchone()[0]
+        return {
+            "enabled": True,
+            "pending": counts.get("pending", 0),
+            "created": counts.get("created", 0),
+            "sent": counts.get("sent", 0),
+            "dead": counts.get("dead", 0),
+            "oldestPendingSeconds": round(time.time() - oldest, 1) if oldest else None
+        }
+
+
+class OutboxDispatcher:
+    """
+    Background task that drains a QuestionOutbox through send(payload, idempotency_key),
+    which creates the question and returns (response, previous_question_id), and
+    link(previous_question_id, question_id).
+
+    Entries are sent one at a time in append order, so questions are still
+    created, and chained by previousQuestionId, in the order they were
+    generated. An entry waiting for its retry holds back the ones after it.
+    The question id is stored as soon as the question is created, so an entry
+    whose link fails is retried from the link and never created twice.
+    """
+
+    def __init__(self, outbox, send, link, poll_seconds=QUESTION_OUTBOX_POLL_SECONDS):
+        self.outbox = outbox
+        self.send = send
+        self.link = link
+        self.poll_seconds = poll_seconds
+        self._task = None
+        self._wake = None
+        self.dispatched = 0
+        self.retries = 0
+
+    def start(self):
+        if self._task is None:
+            self._wake = asyncio.Event()
+            self._task = asyncio.ensure_future(self._run())
+            logger.info("Started question outbox dispatcher")
+
+    def wake(self):
+        """Dispatch new entries now instead of at the next poll."""
+        if self._wake is not None:
+            self._wake.set()
+
+    async def _wait(self, seconds):
+        try:
+            await asyncio.wait_for(self._wake.wait(), timeout=max(0.0, seconds))
+        except asyncio.TimeoutError:
+            pass
+        self._wake.clear()
+
+    async def _run(self):
+        while True:
+            try:
+                entry = await run_in_threadpool(self.outbox.next_pending)
+                if entry is None:
+                    await self._wait(self.poll_seconds)
+                    continue
+                outbox_id, key, payload, attempts, next_attempt_at, created = entry
+                if next_attempt_at > time.time():
+                    await self._wait(next_attempt_at - time.time())
+                    continue
+                await self._dispatch(outbox_id, key, payload, attempts, created)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Question outbox dispatcher error: {e}")
+                await self._wait(self.poll_seconds)
+
+    async def _dispatch(self, outbox_id, key, payload, attempts, created=None):
+        question_id, previous_question_id = created or (None, None)
+        try:
+            if created is None:
+                response, previous_question_id = await self.send(payload, key)
+                question_id = (response or {}).get('data', {}).get('id')
+                if question_id:
+                    await run_in_threadpool(self.outbox.mark_created, outbox_id, question_id, previous_question_id)
+                else:
+                    logger.warning(f"No question ID found in response for outbox entry {outbox_id}")
+            else:
+                logger.info(f"Outbox entry {outbox_id} was created as question {question_id}, linking it")
+            if question_id:
+                await self.link(previous_question_id, question_id)
+        except Exception as e:
+            status = await run_in_threadpool(self.outbox.mark_failed, outbox_id, attempts, e)
+            self.retries += 1
+            logger.error(f"Outbox entry {outbox_id} failed on attempt {attempts + 1}, now {status}: {e}")
+            if status == "dead" and question_id:
+                logger.error(f"Question {question_id} was created but not linked after {previous_question_id}, see the dead entries in /outbox")
+            return
+        await run_in_threadpool(self.outbox.mark_sent, outbox_id, question_id)
+        self.dispatched += 1
+        logger.info(f"Outbox entry {outbox_id} created and linked as question {question_id}")
+
+    async def drain(self, timeout):
+        """Wait up to timeout seconds for the pending entries to be dispatched. Return True if none are left."""
+        deadline = time.monotonic() + timeout
+        self.wake()
+        while await run_in_threadpool(self.outbox.next_pending) is not None:
+            if time.monotonic() >= deadline:
+                return False
+            await asyncio.sleep(0.2)
+        return True
+
+    def stats(self):
+        return {
+            **self.outbox.stats(),
+            "running": self._task is not None and not self._task.done(),
+            "dispatched": self.dispatched,
+            "retries": self.retries
+        }
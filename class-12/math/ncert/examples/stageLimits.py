@@ -0,0 +1,58 @@
+import asyncio
+import logging
+import os
+from contextlib import asynccontextmanager
+
+from fastapi.concurrency import run_in_threadpool
+
+logger = logging.getLogger(__name__)
+
+# Maximum in-flight work per pipeline stage, overridable with STAGE_LIMIT_<STAGE>
+DEFAULT_STAGE_LIMITS = {
+    "extraction": 2,
+    "generation": 8,
+    "create": 4,
+    "state": 1,
+    "cache": 4
+}
+
+
+def load_stage_limits():
+    """Read per-stage limits from STAGE_LIMIT_<STAGE> environment variables."""
+    return {
+        stage: int(os.getenv(f"STAGE_LIMIT_{stage.upper()}", str(default)))
+        for stage, default in DEFAULT_STAGE_LIMITS.items()
+    }
+
+
+class StageLimiter:
+    """Bounds concurrent work per stage and runs blocking calls off the event loop."""
+
+    def __init__(self, limits=None):
+        self.limits = limits or load_stage_limits()
+        self._semaphores = {}
+        self.in_flight = {stage: 0 for stage in self.limits}
+
+    def _semaphore(self, stage):
+        if stage not in self._semaphores:
+            self._semaphores[stage] = asyncio.Semaphore(self.limits[stage])
+        return self._semaphores[stage]
+
+    @asynccontextmanager
+    async def limit(self, stage):
+        """Hold one of the stage's slots for the duration of the block."""
+        async with self._semaphore(stage):
+            self.in_flight[stage] += 1
+            try:
+                yield
+            finally:
+                self.in_flight[stage] -= 1
+
+    async def run_blocking(self, stage, func, *args, **kwargs):
+        """Run a blocking function in the thread pool within the stage's limit."""
+        async with self.limit(stage):
+            return await run_in_threadpool(func, *args, **kwargs)
+
+    def stats(self):
+        """Return configured limits and current in-flight counts per stage."""
+        return {stage: {"limit": self.limits[stage], "inFlight": self.in_flight[stage]} for stage in self.limits}
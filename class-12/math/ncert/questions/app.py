@@ -2,17 +2,40 @@
 # pip install fastapi uvicorn google-generativeai PyPDF2 python-multipart python-dotenv
 
 from fastapi import FastAPI, File, Form, UploadFile, HTTPException
-from fastapi.responses import JSONResponse
-import google.generativeai as genai
-import PyPDF2
 import os
 import json
+import re
 import logging
+import time
 from typing import Optional
-from dotenv import load_dotenv
-from createQuestion import createQuestion as create_question_api
 import requests
 import xml.etree.ElementTree as ET
+from dotenv import load_dotenv
+
+# Load environment variables before the local modules below read their settings
+load_dotenv()
+
+from adaptiveConcurrency import AimdLimiter
+from authToken import token_provider
+from contextCache import get_context_cache
+from createQuestion import createQuestion as create_question_api, link_question, post_question, question_linker, question_sink
+from documentStore import DocumentStore
+from httpClient import http_client
+from llmBackend import get_llm_backend
+from pdfCache import PdfTextCache
+from pdfExtractor import get_pdf_extractor
+from pipelineRunner import PIPELINE_MAX_QUESTIONS, PipelineRunner
+from promptTemplates import prompt_templates
+from questionIndex import TokenSavings, estimate_tokens, get_question_index
+from questionOutbox import QUESTION_OUTBOX_DRAIN_SECONDS, OutboxDispatcher, QuestionOutbox
+from requestStats import RequestRecord, RequestStatsStore
+from rateLimiter import GEMINI_EXPECTED_OUTPUT_TOKENS, GeminiScheduler
+from responseCache import LlmResponseCache, hash_text
+from retryEngine import AttemptLog, RetryEngine, build_repair_prompt, classify_error
+from singleFlight import SingleFlight
+from stageLimits import StageLimiter
+from tokenBudget import TokenBudget
+from uploadStorage import spooled_upload
 
 # Configure logging
 logging.basicConfig(
@@ -25,19 +48,29 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
-# Load environment variables
-load_dotenv()
+# Select the LLM backend (Gemini, or the offline fake) at startup
+llm_backend = get_llm_backend()
 
-# Get API key from environment variable
-GOOGLE_API_KEY = os.getenv("GOOGLE_API_KEY")
-if not GOOGLE_API_KEY:
-    raise ValueError("GOOGLE_API_KEY environment variable is not set")
+app = FastAPI()
 
-# Configure Gemini API
-genai.configure(api_key=GOOGLE_API_KEY)
-model = genai.GenerativeModel('gemini-2.0-flash')
+# Number of questions requested per Gemini call by /process_exercise
+BATCH_CHUNK_SIZE = int(os.getenv('BATCH_CHUNK_SIZE', '5'))
 
-app = FastAPI()
+pdf_extractor = get_pdf_extractor()
+pdf_text_cache = PdfTextCache()
+token_savings = TokenSavings()
+document_store = DocumentStore()
+stage_limiter = StageLimiter()
+llm_response_cache = LlmResponseCache()
+gemini_scheduler = GeminiScheduler()
+gemini_concurrency = AimdLimiter(max_window=stage_limiter.limits["generation"])
+retry_engine = RetryEngine()
+context_cache = get_context_cache(model_name=llm_backend.model_name)
+pipeline_runner = PipelineRunner()
+single_flight = SingleFlight()
+request_stats = RequestStatsStore()
+token_budget = TokenBudget(count_exact=llm_backend.count_tokens)
+question_outbox = QuestionOutbox()
 
 def get_next_sequence_number(board, source, subjectCode, gradeCode, topicCode, chapterNo):
     """Get current sequence number from local file."""
@@ -136,36 +169,79 @@ def update_question_number(board, source, subjectCode, gradeCode, topicCode, cha
     except Exception as e:
         logger.error(f"Error updating question numbers: {e}")
 
+def normalize_question_no(question_no):
+    """Reduce a questionNo like "Example 3", "Q3" or "3." to "3" so it can be matched to a requested number."""
+    return re.sub(r'^(?:example|question|q)\.?\s*', '', str(question_no).strip(), flags=re.IGNORECASE).rstrip('.').strip().lower()
+
+
+def match_questions(question_numbers, questions):
+    """
+    Return [(question_number, question)] for the leading run of question_numbers found
+    in questions by questionNo, stopping at the first one missing.
+
+    Raises ValueError when the first requested number is missing, so the response
+    is repaired or the request fails instead of nothing being created.
+    """
+    by_number = {}
+    for json_data in questions:
+        by_number.setdefault(normalize_question_no(json_data.get("questionNo", "")), json_data)
+    matched = []
+    for question_number in question_numbers:
+        json_data = by_number.get(normalize_question_no(question_number))
+        if json_data is None:
+            if not matched:
+                received = [question.get("questionNo", "") for question in questions]
+                raise ValueError(f"Question {question_number} missing from the response, which has {received}")
+            logger.warning(f"Question {question_number} missing from the response, creating {len(matched)} of {len(question_numbers)} questions")
+            break
+        matched.append((question_number, json_data))
+    return matched
+
+
+def parse_question_for(question_number):
+    """Return a parser for a single-question response that rejects any other questionNo."""
+    return lambda response_text: match_questions([question_number], [extract_fields_from_xml(response_text)])[0][1]
+
+
+def get_question_numbers_from(first_number, count):
+    """Get up to count question numbers starting at first_number, stopping before END."""
+    try:
+        with open("example-numbers.txt", "r") as f:
+            example_numbers = [line.strip() for line in f if line.strip()]
+    except Exception as e:
+        logger.error(f"Error reading example numbers: {e}")
+        example_numbers = []
+
+    numbers = [str(first_number)]
+    while len(numbers) < count:
+        current_number = numbers[-1]
+        if current_number in example_numbers:
+            i = example_numbers.index(current_number)
+            next_number = example_numbers[i + 1] if i + 1 < len(example_numbers) else "END"
+        else:
+            try:
+                next_number = str(int(current_number) + 1)
+            except ValueError:
+                next_number = "END"
+        if next_number == "END":
+            break
+        numbers.append(next_number)
+    return numbers
+
 def extract_text_from_pdf(pdf_path: str) -> str:
-    """Extracts text content from a PDF file using external API."""
+    """Extracts text content from a PDF file using the configured extractor."""
+    cache_key = pdf_text_cache.key_for(pdf_path, pdf_extractor.version)
+    cached_text = pdf_text_cache.get(cache_key)
+    if cached_text is not None:
+        logger.info(f"PDF text cache hit for {pdf_path}: {pdf_text_cache.stats()}")
+        return cached_text
+    logger.info(f"PDF text cache miss for {pdf_path}: {pdf_text_cache.stats()}")
+
     try:
-        # API endpoint
-        url = "http://localhost:5000/read-pdf"
-        
-        # Headers
-        headers = {
-            'x-api-key': os.getenv('PDF_API_KEY', '')  # Get API key from environment variable
-        }
-        
-        # Prepare the file
-        with open(pdf_path, 'rb') as pdf_file:
-            files = {
-                'file': (os.path.basename(pdf_path), pdf_file, 'application/pdf')
-            }
-            
-            # Make the API call
-            response = requests.post(url, headers=headers, files=files)
-            response.raise_for_status()  # Raise exception for bad status codes
-            
-            # Parse the response
-            result = response.json()
-            if result.get('success'):
-                text = result.get('text', '')
-                logger.info(f"Successfully extracted text from PDF: {pdf_path}")
-                return text
-            else:
-                raise Exception("PDF text extraction failed")
-                
+        text = pdf_extractor.extract(pdf_path)
+        logger.info(f"Successfully extracted text from PDF using {pdf_extractor.name} extractor: {pdf_path}")
+        pdf_text_cache.put(cache_key, text)
+        return text
     except requests.exceptions.RequestException as e:
         logger.error(f"API request failed: {e}")
         raise HTTPException(status_code=500, detail=f"Error calling PDF extraction API: {e}")
@@ -173,10 +249,48 @@ def extract_text_from_pdf(pdf_path: str) -> str:
         logger.error(f"Error extracting text from PDF {pdf_path}: {e}")
         raise HTTPException(status_code=400, detail=f"Error reading PDF: {e}")
 
-def extract_fields_from_xml(xml_text):
-    """Extract fields from XML response and return a dictionary."""
+def extract_question_fields(question):
+    """Extract fields from a single question element and return a dictionary."""
+    try:
+        title_en = question.findtext('.//title/en', '').strip()
+        english_title_en = question.findtext('.//englishTitle', '').strip()
+        solution_en = question.findtext('.//solution/en', '').strip()
+        explanation_en = question.findtext('.//explanation/en', '').strip()
+        solution_wo_latex_en = question.findtext('.//solutionWOLatex/en', '').strip()
+        difficulty_level = question.findtext('.//difficultyLevelCode', '').strip()
+        question_no = question.findtext('.//questionNo', '').strip()
+
+        result = {
+            "title": {"en": title_en},
+            "englishTitle": english_title_en,
+            "solution": {"en": solution_en},
+            "explanation": {"en": explanation_en},
+            "solutionWOLatex": {"en": solution_wo_latex_en},
+            "difficultyLevelCode": difficulty_level,
+            "questionNo": question_no
+        }
+
+        # Log the extracted fields (first 100 chars of each)
+        logger.info("Extracted fields:")
+        for key, value in result.items():
+            logger.info(f"{key}: {str(value)[:100]}...")
+
+        return result
+
+    except Exception as e:
+        logger.error(f"Error extracting specific fields: {e}")
+        raise ValueError(f"Error extracting fields from XML: {e}")
+
+def extract_fields_from_xml(xml_text, multiple=False):
+    """
+    Extract fields from XML response and return a dictionary.
+
+    With multiple=True, every question element is extracted and a list of
+    dictionaries is returned in document order.
+    """
     try:
         # Remove markdown code block markers if present
+        xml_text = xml_text.strip()
         if xml_text.startswith("```xml"):
             xml_text = xml_text.replace("```xml", "").replace("```", "").strip()
         
@@ -184,46 +298,21 @@ def extract_fields_from_xml(xml_text):
         
         # Parse XML string
         root = ET.fromstring(xml_text)
+
+        if multiple:
+            questions = [root] if root.tag == 'question' else root.findall('question')
+            if not questions:
+                logger.error(f"XML structure: {ET.tostring(root, encoding='unicode')[:200]}...")  # Log XML structure
+                raise ValueError("No question element found in XML")
+            return [extract_question_fields(question) for question in questions]
         
         # If root is the question element, use it directly
         question = root if root.tag == 'question' else root.find('question')
         if question is None:
             logger.error(f"XML structure: {ET.tostring(root, encoding='unicode')[:200]}...")  # Log XML structure
             raise ValueError("No question element found in XML")
-        
-        # Extract fields with more detailed error handling
-        try:
-            title_en = question.findtext('.//title/en', '').strip()
-            english_title_en = question.findtext('.//englishTitle', '').strip()
-            solution_en = question.findtext('.//solution/en', '').strip()
-            explanation_en = question.findtext('.//explanation/en', '').strip()
-            solution_wo_latex_en = question.findtext('.//solutionWOLatex/en', '').strip()
-            difficulty_level = question.findtext('.//difficultyLevelCode', '').strip()
-            question_no = question.findtext('.//questionNo', '').strip()
-            
-            result = {
-                "title": {"en": title_en},
-                "englishTitle": english_title_en,
-                "solution": {"en": solution_en},
-                "explanation": {"en": explanation_en},
-                "solutionWOLatex": {"en": solution_wo_latex_en},
-                "difficultyLevelCode": difficulty_level,
-                "questionNo": question_no
-            }
-            
-            # Log the extracted fields (first 100 chars of each)
-            logger.info("Extracted fields:")
-            for key, value in result.items():
-                if isinstance(value, dict):
-                    logger.info(f"{key}: {str(value)[:100]}...")
-                else:
-                    logger.info(f"{key}: {str(value)[:100]}...")
-            
-            return result
-            
-        except Exception as e:
-            logger.error(f"Error extracting specific fields: {e}")
-            raise ValueError(f"Error extracting fields from XML: {e}")
+
+        return extract_question_fields(question)
             
     except ET.ParseError as e:
         logger.error(f"XML parsing error: {e}")
@@ -232,108 +321,672 @@ def extract_fields_from_xml(xml_text):
         logger.error(f"Error extracting fields from XML: {e}")
         raise
 
-@app.post("/process_pdf")
-async def process_pdf(
-    pdf_file: UploadFile = File(...),
-    prompt: str = Form(...),
-    status: str = Form(...),
-    gradeCode: str = Form(...),
-    subjectCode: str = Form(...),
-    topicCode: str = Form(...),
-    postedByUserId: str = Form(...),
-    board: str = Form(...),
-    source: str = Form(...),
-    chapterNo: str = Form(...),
-    exerciseCode: str = Form(...)
+@app.get("/pdf_cache_stats")
+async def pdf_cache_stats():
+    """Return hit/miss counters of the extracted PDF text cache."""
+    return pdf_text_cache.stats()
+
+@app.get("/stage_stats")
+async def stage_stats():
+    """Return concurrency limits and in-flight work per pipeline stage."""
+    return stage_limiter.stats()
+
+@app.get("/llm_cache_stats")
+async def llm_cache_stats():
+    """Return hit/miss counters of the LLM response cache."""
+    return await stage_limiter.run_blocking("cache", llm_response_cache.stats)
+
+def storage_metrics():
+    """Return the metrics read from disk, the deferred links and the outbox."""
+    return {"links": question_linker.stats(), "outbox": outbox_dispatcher.stats()}
+
+@app.get("/metrics")
+async def metrics():
+    """Return the adaptive Gemini concurrency window, latency percentiles and throttle events."""
+    storage = await stage_limiter.run_blocking("cache", storage_metrics)
+    return {
+        "geminiConcurrency": gemini_concurrency.stats(),
+        "scheduler": gemini_scheduler.stats(),
+        "retries": retry_engine.stats(),
+        "contextCache": context_cache.stats() if context_cache else None,
+        "pipeline": pipeline_runner.stats(),
+        "singleFlight": single_flight.stats(),
+        "tokenBudget": token_budget.stats(),
+        "auth": token_provider.stats(),
+        "http": http_client.stats(),
+        "links": storage["links"],
+        "sink": question_sink.stats(),
+        "outbox": storage["outbox"],
+        "stages": stage_limiter.stats()
+    }
+
+@app.get("/scheduler_stats")
+async def scheduler_stats():
+    """Return admissions and queue depth of the Gemini rate-limit scheduler."""
+    return gemini_scheduler.stats()
+
+@app.get("/prompt_templates")
+async def list_prompt_templates():
+    """Return the registered prompt templates with their versions, parameters and modes."""
+    return prompt_templates.describe()
+
+@app.get("/stats")
+async def stats(
+    groupBy: str = "gradeCode,chapterNo,exerciseCode,promptVersion",
+    endpoint: Optional[str] = None,
+    gradeCode: Optional[str] = None,
+    chapterNo: Optional[str] = None,
+    exerciseCode: Optional[str] = None,
+    promptVersion: Optional[str] = None,
+    outcome: Optional[str] = None,
+    since: Optional[float] = None
 ):
-    logger.info(f"Received PDF processing request for file: {pdf_file.filename}")
-    logger.info(f"Parameters - Board: {board}, Source: {source}, Subject: {subjectCode}, Grade: {gradeCode}, Topic: {topicCode}, Chapter: {chapterNo}, Exercise: {exerciseCode}")
+    """Return requests, tokens, stage durations and outcomes aggregated by the groupBy fields."""
+    filters = {
+        "endpoint": endpoint,
+        "gradeCode": gradeCode,
+        "chapterNo": chapterNo,
+        "exerciseCode": exerciseCode,
+        "promptVersion": promptVersion,
+        "outcome": outcome
+    }
+    group_by = [field.strip() for field in groupBy.split(",") if field.strip()]
+    try:
+        return await stage_limiter.run_blocking(
+            "cache", request_stats.aggregate, group_by, {field: value for field, value in filters.items() if value is not None}, since
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+def outbox_report():
+    """Return the outbox stats and its dead entries, including questions created but never linked."""
+    return {**outbox_dispatcher.stats(), "deadEntries": question_outbox.dead_entries()}
+
+@app.get("/outbox")
+async def outbox_stats():
+    """Return the questions waiting in, created from and dead in the question outbox."""
+    return await stage_limiter.run_blocking("cache", outbox_report)
+
+@app.post("/outbox/requeue")
+async def requeue_outbox():
+    """Queue the dead outbox entries for dispatch again."""
+    if not question_outbox.enabled:
+        raise HTTPException(status_code=400, detail="The question outbox is not enabled.")
+    requeued = await stage_limiter.run_blocking("cache", question_outbox.requeue_dead)
+    outbox_dispatcher.wake()
+    return {"requeued": requeued}
+
+@app.get("/links/broken")
+async def broken_links():
+    """Return the nextQuestionId links held back because they break the question chain."""
+    return {"broken": await stage_limiter.run_blocking("cache", question_linker.broken)}
+
+@app.post("/links/broken/drop")
+async def drop_broken_links():
+    """Drop the broken links once the question chain has been repaired by hand."""
+    return {"dropped": await stage_limiter.run_blocking("cache", question_linker.drop_broken)}
+
+@app.get("/token_savings_stats")
+async def token_savings_stats():
+    """Return prompt tokens saved by sending only the requested question segment."""
+    return token_savings.stats()
+
+@app.post("/documents")
+async def upload_document(pdf_file: UploadFile = File(...)):
+    """Store an uploaded PDF with its extracted text and return its doc_id."""
+    logger.info(f"Received document upload for file: {pdf_file.filename}")
 
     if not pdf_file.filename.endswith(".pdf"):
         logger.error(f"Invalid file format received: {pdf_file.filename}")
         raise HTTPException(status_code=400, detail="Invalid file format. Only PDF files are allowed.")
 
+    async with spooled_upload(pdf_file) as file_path:
+        pdf_text = await stage_limiter.run_blocking("extraction", extract_text_from_pdf, file_path)
+        document = await stage_limiter.run_blocking("extraction", document_store.save, pdf_file.filename, file_path, pdf_text)
+
+    return {"doc_id": document.doc_id, "filename": document.filename, "characters": len(document.text)}
+
+def resolve_prompt(prompt, prompt_template_id, prompt_template_version, prompt_params):
+    """
+    Return (prompt, prompt_version) for a raw prompt, or for a registered
+    template referenced by id, optional version and JSON-encoded parameters.
+    """
+    if prompt_template_id:
+        try:
+            params = json.loads(prompt_params) if prompt_params else {}
+            if not isinstance(params, dict):
+                raise ValueError("promptParams must be a JSON object")
+            return prompt_templates.render(prompt_template_id, prompt_template_version, tuple(sorted((name, str(value)) for name, value in params.items())))
+        except ValueError as e:
+            logger.error(f"Invalid prompt template request {prompt_template_id}@{prompt_template_version}: {e}")
+            raise HTTPException(status_code=400, detail=f"Invalid prompt template request: {e}")
+    if not prompt:
+        logger.error("Neither prompt nor promptTemplateId was provided")
+        raise HTTPException(status_code=400, detail="Either prompt or promptTemplateId is required.")
+    return prompt, hash_text(prompt)
+
+def build_response_cache_key(prompt_version, pdf_text, question_number):
+    """Key a Gemini response by prompt version, document, question number, model and generation config."""
+    return LlmResponseCache.make_key(
+        prompt_version=prompt_version,
+        document_hash=hash_text(pdf_text),
+        question_number=question_number,
+        model_name=llm_backend.model_name,
+        generation_config=llm_backend.generation_config
+    )
+
+def build_request_fingerprint(prompt_version, pdf_text, question_number, fields):
+    """Identify a generation request by document, prompt, question number and question metadata."""
+    return hash_text(json.dumps({
+        "documentHash": hash_text(pdf_text),
+        "promptVersion": prompt_version,
+        "questionNumber": str(question_number),
+        "fields": fields
+    }, sort_keys=True))
+
+def build_prompt_context(prompt, prompt_version, pdf_text):
+    """Return the (key, prefix) shared by every question of a document for context caching."""
+    key = f"{hash_text(pdf_text)[:16]}-{hash_text(prompt_version)[:16]}"
+    prefix = f"{prompt}\n\nBased on the content of the following PDF:\n\n{pdf_text}"
+    return key, prefix
+
+async def fit_prompt(prompt, prompt_version, pdf_text, question_numbers, instruction):
+    """
+    Return (final_prompt, context, prompt_tokens) for question_numbers within the per-request token limit.
+
+    Tokens are counted before anything is sent. The questions' segment is
+    tried first, then the segment without its surrounding context. When
+    context caching is on and the document can be cached, the whole document
+    is used instead as a cached prefix, with the segment prompt kept in
+    context as the fallback if the cache cannot be created. A prompt that
+    still does not fit is refused rather than sent to fail or be truncated.
+    """
+    question_index = get_question_index(pdf_text)
+    if not question_index.covers(question_numbers):
+        logger.warning(f"Questions {question_numbers} not all found in index, using full PDF text")
+    trimmed = False
+    fitted = None
+    for context_chars in (None, 0):
+        question_text = question_index.segment_for_many(question_numbers, context_chars)
+        final_prompt = f"{prompt}\n\nBased on the content of the following PDF:\n\n{question_text}\n\n{instruction}"
+        prompt_tokens = await token_budget.count(final_prompt)
+        if token_budget.fits(prompt_tokens):
+            fitted = (final_prompt, question_text, prompt_tokens)
+            break
+        logger.warning(f"Prompt for {question_numbers} has {prompt_tokens} tokens, over the limit of {token_budget.max_prompt_tokens}")
+        trimmed = True
+
+    if context_cache:
+        key, prefix = build_prompt_context(prompt, prompt_version, pdf_text)
+        if context_cache.cacheable(key, prefix):
+            # The document prefix is counted once and memoized across questions
+            prompt_tokens = await token_budget.count(instruction) + await token_budget.count(prefix)
+            if token_budget.fits(prompt_tokens):
+                return instruction, (key, prefix, fitted[0] if fitted else None), prompt_tokens
+            logger.warning(f"Prompt for {question_numbers} has {prompt_tokens} tokens, over the limit of {token_budget.max_prompt_tokens}")
+            trimmed = True
+
+    if fitted is None:
+        token_budget.refuse(f"Prompt for {question_numbers} does not fit the limit of {token_budget.max_prompt_tokens} tokens even when trimmed to the question segment")
+    final_prompt, question_text, prompt_tokens = fitted
+    if trimmed:
+        token_budget.record_trim()
+        logger.info(f"Trimmed prompt for {question_numbers} to {prompt_tokens} tokens")
+    # Send only the requested questions' segment instead of the whole PDF
+    savings = token_savings.record(pdf_text, question_text)
+    logger.info(f"Questions {question_numbers} prompt segment token savings: {savings}")
+    return final_prompt, None, prompt_tokens
+
+async def call_llm(prompt, caller, attempt_log, context=None):
+    """
+    Send one prompt to the LLM backend and return the response text.
+
+    The call waits for admission by the rate-limit scheduler, queued fairly
+    per caller, and runs within the adaptive concurrency window. With a
+    (key, prefix, fallback_prompt) context from fit_prompt, prompt is sent on
+    top of the cached prefix, or fallback_prompt is sent instead if the
+    prefix cannot be cached.
+    """
+    attempt_log.calls += 1
+    # Tokens served from a context cache still count against the TPM limit
+    prefix_tokens = estimate_tokens(context[1]) if context else 0
+    await gemini_scheduler.acquire(prefix_tokens + estimate_tokens(prompt) + GEMINI_EXPECTED_OUTPUT_TOKENS, caller)
+
+    # Generate content without blocking the event loop, within the adaptive window
+    async with gemini_concurrency.slot(), stage_limiter.limit("generation"):
+        cached_prefix = await context_cache.get_or_create(context[0], context[1]) if context else None
+        if cached_prefix:
+            response_text, usage = await context_cache.generate(cached_prefix, prompt)
+        else:
+            if context:
+                key, prefix, fallback_prompt = context
+                prompt = fallback_prompt or f"{prefix}\n\n{prompt}"
+            response_text, usage = await llm_backend.generate(prompt)
+    estimated_tokens = estimate_tokens(prompt) + estimate_tokens(response_text)
+    attempt_log.estimated_tokens += estimated_tokens
+    # Prefer the token counts reported by the API over the estimate
+    prompt_tokens, candidate_tokens = usage or (estimate_tokens(prompt), estimate_tokens(response_text))
+    attempt_log.prompt_tokens += prompt_tokens
+    attempt_log.candidate_tokens += candidate_tokens
+    return response_text
+
+async def generate_parsed(final_prompt, cache_key, parse, bypass_cache=False, caller="default", context=None, record=None, prompt_tokens=0, instruction=None):
+    """
+    Return parse(response) for final_prompt, served from the LLM response cache when possible.
+
+    Transient API errors are retried with backoff. When the response does not
+    parse, only the broken output is sent back with a short repair prompt
+    that repeats instruction, so the repair still answers the requested numbers.
+    parse also validates the response (e.g. the requested question numbers) by
+    raising ValueError, and responses are cached only once it accepts them, so
+    malformed or mismatched output is never replayed. A cached response that
+    parse rejects is regenerated and replaced.
+    Generation and parse durations, calls and tokens are added to record.
+    Calls that reach the API are charged prompt_tokens against the caller's run budget.
+    """
+    record = record or RequestRecord("generate_parsed")
+    if bypass_cache:
+        llm_response_cache.record_bypass()
+    else:
+        cached_text = await stage_limiter.run_blocking("cache", llm_response_cache.get, cache_key)
+        if cached_text is not None:
+            logger.info(f"LLM response cache hit for key {cache_key}")
+            try:
+                with record.stage("parse"):
+                    return parse(cached_text)
+            except ValueError as e:
+                logger.warning(f"Cached response for key {cache_key} rejected ({e}), regenerating")
+
+    token_budget.charge(caller, prompt_tokens)
+    attempt_log = AttemptLog()
     try:
-        # Save the uploaded PDF temporarily
-        file_path = f"temp_{pdf_file.filename}"
-        with open(file_path, "wb") as f:
-            content = await pdf_file.read()
-            f.write(content)
-        logger.info(f"Temporarily saved PDF to {file_path}")
+        with record.stage("generation"):
+            response_text = await retry_engine.run(lambda: call_llm(final_prompt, caller, attempt_log, context))
+        while True:
+            try:
+                with record.stage("parse"):
+                    parsed = parse(response_text)
+                break
+            except ValueError as e:
+                if attempt_log.repairs >= retry_engine.repair_attempts:
+                    raise
+                attempt_log.repairs += 1
+                logger.warning(f"Response did not parse ({e}), sending repair prompt {attempt_log.repairs} of {retry_engine.repair_attempts}")
+                repair_prompt = build_repair_prompt(response_text, e, instruction)
+                with record.stage("generation"):
+                    response_text = await retry_engine.run(lambda: call_llm(repair_prompt, caller, attempt_log))
+    except Exception as e:
+        retry_engine.record(f"{classify_error(e)}_failure", attempt_log)
+        raise
+    finally:
+        record.add_usage(attempt_log)
+
+    retry_engine.record("repaired" if attempt_log.repairs else "success", attempt_log)
+    logger.info(f"Generation succeeded after {attempt_log.calls} calls and {attempt_log.repairs} repairs")
+    await stage_limiter.run_blocking("cache", llm_response_cache.put, cache_key, response_text)
+    return parsed
+
+async def run_state(record, func, *args):
+    """Read or write the local state files within the state limit, timing it on record."""
+    with record.stage("state"):
+        return await stage_limiter.run_blocking("state", func, *args)
+
+async def create_question(record, formatted_json, prompt_version=None):
+    """
+    Create the question through the question API, adding login, create and link durations to record.
+
+    With the outbox enabled the question is only stored durably, and the
+    outbox dispatcher creates it in the background.
+    """
+    if question_outbox.enabled:
+        with record.stage("create"):
+            entry = await stage_limiter.run_blocking("cache", question_outbox.append, formatted_json, prompt_version)
+        outbox_dispatcher.wake()
+        return entry
+    timings = {}
+    try:
+        return await stage_limiter.run_blocking("create", create_question_api, formatted_json, timings)
+    finally:
+        record.add_stages(timings)
+
+async def persist_question(record, question_number, json_data, fields, prompt_version):
+    """
+    Format and create one question, then advance the stored sequence and question numbers.
+
+    fields is the request metadata passed to format_question_json. Callers
+    persist questions strictly in order so previousQuestionId chaining and the
+    state files stay consistent.
+    """
+    state_key = (fields["board"], fields["source"], fields["subjectCode"], fields["gradeCode"], fields["topicCode"], fields["chapterNo"])
+    next_sequence_number = await run_state(record, get_next_sequence_number, *state_key)
+    formatted_json = format_question_json(json_data, seqNumber=next_sequence_number, **fields)
+    api_response = await create_question(record, formatted_json, prompt_version)
+    await run_state(record, update_sequence_number, *state_key, next_sequence_number)
+    logger.info(f"Question {question_number} created successfully: {api_response}")
+    await run_state(record, update_question_number, *state_key, question_number)
+    record.questions += 1
+    return formatted_json
+
+async def send_outbox_entry(payload, idempotency_key):
+    """Create a question taken from the outbox through the question API, without linking it."""
+    return await stage_limiter.run_blocking("create", post_question, payload, None, idempotency_key)
+
+async def link_outbox_entry(previous_question_id, question_id):
+    """Link a question created from the outbox to the previous one and store it as the previous question."""
+    await stage_limiter.run_blocking("create", link_question, previous_question_id, question_id)
+
+outbox_dispatcher = OutboxDispatcher(question_outbox, send_outbox_entry, link_outbox_entry)
+
+@app.on_event("startup")
+async def start_outbox_dispatcher():
+    """Start draining the question outbox, including entries left over from a previous run."""
+    if question_outbox.enabled:
+        outbox_dispatcher.start()
+
+async def flush_links(record, force=True):
+    """Apply the deferred nextQuestionId links, timing them as the link stage on record."""
+    if not question_linker.deferred:
+        return
+    with record.stage("link"):
+        await stage_limiter.run_blocking("create", question_linker.flush, force)
+
+async def finish_request(record):
+    """Store the request's stats off the event loop."""
+    await stage_limiter.run_blocking("cache", request_stats.record, record)
+
+async def load_pdf_text(pdf_file, doc_id, record):
+    """Return the text of the referenced document, or of the uploaded PDF, timing upload and extraction on record."""
+    if doc_id:
+        logger.info(f"Received PDF processing request for document: {doc_id}")
+        document = await stage_limiter.run_blocking("cache", document_store.get, doc_id)
+        if document is None:
+            logger.error(f"Unknown document id: {doc_id}")
+            raise HTTPException(status_code=404, detail=f"Document not found: {doc_id}")
+        return document.text
 
+    if pdf_file is None:
+        logger.error("Neither pdf_file nor doc_id was provided")
+        raise HTTPException(status_code=400, detail="Either pdf_file or doc_id is required.")
+
+    logger.info(f"Received PDF processing request for file: {pdf_file.filename}")
+    if not pdf_file.filename.endswith(".pdf"):
+        logger.error(f"Invalid file format received: {pdf_file.filename}")
+        raise HTTPException(status_code=400, detail="Invalid file format. Only PDF files are allowed.")
+
+    # Stream the upload to a per-request temporary file, removed on every path
+    upload_started_at = time.monotonic()
+    async with spooled_upload(pdf_file) as file_path:
+        record.add_stage("upload", time.monotonic() - upload_started_at)
         try:
-            pdf_text = extract_text_from_pdf(file_path)
+            with record.stage("extraction"):
+                return await stage_limiter.run_blocking("extraction", extract_text_from_pdf, file_path)
         except Exception as e:
             logger.error(f"Error extracting text from PDF: {e}")
             raise HTTPException(status_code=500, detail=f"Error extracting text from PDF: {e}")
 
-        next_question_number = get_next_question_number(board, source, subjectCode, gradeCode, topicCode, chapterNo)
+@app.post("/process_pdf")
+async def process_pdf(
+    pdf_file: Optional[UploadFile] = File(None),
+    doc_id: Optional[str] = Form(None),
+    prompt: Optional[str] = Form(None),
+    promptTemplateId: Optional[str] = Form(None),
+    promptTemplateVersion: Optional[str] = Form(None),
+    promptParams: Optional[str] = Form(None),
+    status: str = Form(...),
+    gradeCode: str = Form(...),
+    subjectCode: str = Form(...),
+    topicCode: str = Form(...),
+    postedByUserId: str = Form(...),
+    board: str = Form(...),
+    source: str = Form(...),
+    chapterNo: str = Form(...),
+    exerciseCode: str = Form(...),
+    bypassCache: bool = Form(False)
+):
+    record = RequestRecord("process_pdf", gradeCode, chapterNo, exerciseCode)
+    try:
+        pdf_text = await load_pdf_text(pdf_file, doc_id, record)
+        prompt, prompt_version = resolve_prompt(prompt, promptTemplateId, promptTemplateVersion, promptParams)
+    except Exception as e:
+        record.fail(e)
+        await finish_request(record)
+        raise
+    record.prompt_version = prompt_version
+    logger.info(f"Parameters - Board: {board}, Source: {source}, Subject: {subjectCode}, Grade: {gradeCode}, Topic: {topicCode}, Chapter: {chapterNo}, Exercise: {exerciseCode}, Prompt version: {prompt_version}")
+
+    try:
+        next_question_number = await run_state(record, get_next_question_number, board, source, subjectCode, gradeCode, topicCode, chapterNo)
         if(next_question_number == "END"):
             logger.info("Processed till last question. Stopping the process.")
+            record.outcome = "end"
+            if question_outbox.enabled and not await outbox_dispatcher.drain(QUESTION_OUTBOX_DRAIN_SECONDS):
+                logger.warning("Stopping with questions still in the outbox, they are created on the next start")
+            await flush_links(record)
+            await finish_request(record)
             os._exit(0)
-        # Construct the final prompt for Gemini
-        final_prompt = f"""{prompt}\n\n
-                        Based on the content of the following PDF:\n\n{pdf_text}
-                         Pick up question number {next_question_number}
-                        """
-        #if lastQuestionNumber < next_question_number:
-        #    raise HTTPException(status_code=500, detail="No new questions found")
-
-        logger.info("Generated final prompt for Gemini")
-
-        # Generate content using Gemini 1.0 Pro
-        response = model.generate_content(final_prompt)
-        response.resolve()  # Ensure the response is fully resolved
-        # response object should be printed as string in following logger
-        logger.info(f"Received response from Gemini: {response}")
-
-        # Clean up the temporary file
-        os.remove(file_path)
-        logger.info(f"Removed temporary file: {file_path}")
-
-        # Extract fields from XML response
-        response_text = response.text
-        logger.info(f"Received response from Gemini: {response_text}")
+
+        # Duplicates of this request resolved to the same question share one generation and one created question
+        fields = {
+            "status": status,
+            "gradeCode": gradeCode,
+            "subjectCode": subjectCode,
+            "topicCode": topicCode,
+            "postedByUserId": postedByUserId,
+            "board": board,
+            "source": source,
+            "chapterNo": chapterNo,
+            "exerciseCode": exerciseCode
+        }
+        record.question_numbers = [str(next_question_number)]
+        fingerprint = build_request_fingerprint(prompt_version, pdf_text, next_question_number, fields)
+
+        async def solve_question():
+            question_instruction = f"Pick up question number {next_question_number}"
+            # Instructions and PDF text are cached once per document and prompt when they fit, only the instruction is sent
+            final_prompt, context, prompt_tokens = await fit_prompt(prompt, prompt_version, pdf_text, [next_question_number], question_instruction)
+            #if lastQuestionNumber < next_question_number:
+            #    raise HTTPException(status_code=500, detail="No new questions found")
+
+            logger.info("Generated final prompt for Gemini")
+
+            cache_key = build_response_cache_key(prompt_version, pdf_text, next_question_number)
         
-        try:
-            json_data = extract_fields_from_xml(response_text)
-            logger.info("Successfully parsed XML response")
-            
-            # Format the question JSON
-            next_sequence_number = get_next_sequence_number(board, source, subjectCode, gradeCode, topicCode, chapterNo)
-            formatted_json = format_question_json(
-                json_data,
-                status=status,
-                gradeCode=gradeCode,
-                subjectCode=subjectCode,
-                topicCode=topicCode,
-                postedByUserId=postedByUserId,
-                board=board,
-                source=source,
-                chapterNo=chapterNo,
-                seqNumber=next_sequence_number,
-                exerciseCode=exerciseCode
-            )
-            
-            # Create question using API
             try:
-                api_response = create_question_api(formatted_json)
-                update_sequence_number(board, source, subjectCode, gradeCode, topicCode, chapterNo, next_sequence_number)
-                logger.info(f"Question created successfully: {api_response}")
-                update_question_number(board, source, subjectCode, gradeCode, topicCode, chapterNo, next_question_number)
-                return formatted_json
+                # Generate and extract fields from XML response, retrying and repairing as needed
+                json_data = await generate_parsed(final_prompt, cache_key, parse_question_for(next_question_number), bypassCache, caller=f"{gradeCode}/{exerciseCode}", context=context, record=record, prompt_tokens=prompt_tokens, instruction=question_instruction)
+                logger.info("Successfully parsed XML response")
+            
+                # Create the question and advance the stored numbers
+                try:
+                    formatted_json = await persist_question(record, next_question_number, json_data, fields, prompt_version)
+                    await flush_links(record, force=False)
+                    return {**formatted_json, "promptVersion": prompt_version}
+                except Exception as e:
+                    logger.error(f"Error creating question via API: {e}")
+                    raise HTTPException(status_code=500, detail=f"Error creating question: {e}")
+            except ValueError as e:
+                logger.error(f"Error processing XML response: {e}")
+                raise HTTPException(status_code=500, detail=str(e))
             except Exception as e:
-                logger.error(f"Error creating question via API: {e}")
-                raise HTTPException(status_code=500, detail=f"Error creating question: {e}")
+                logger.error(f"Error processing request: {e}")
+                raise HTTPException(status_code=500, detail=f"Error processing request: {e}")
+
+        return await single_flight.run(fingerprint, solve_question)
+    except Exception as e:
+        logger.error(f"Error processing request: {e}")
+        record.fail(e)
+        raise HTTPException(status_code=500, detail=f"Error processing request: {e}")
+    finally:
+        await finish_request(record)
+
+@app.post("/process_exercise")
+async def process_exercise(
+    pdf_file: Optional[UploadFile] = File(None),
+    doc_id: Optional[str] = Form(None),
+    prompt: Optional[str] = Form(None),
+    promptTemplateId: Optional[str] = Form(None),
+    promptTemplateVersion: Optional[str] = Form(None),
+    promptParams: Optional[str] = Form(None),
+    status: str = Form(...),
+    gradeCode: str = Form(...),
+    subjectCode: str = Form(...),
+    topicCode: str = Form(...),
+    postedByUserId: str = Form(...),
+    board: str = Form(...),
+    source: str = Form(...),
+    chapterNo: str = Form(...),
+    exerciseCode: str = Form(...),
+    chunkSize: int = Form(BATCH_CHUNK_SIZE),
+    bypassCache: bool = Form(False)
+):
+    """Solve the next chunkSize questions of the exercise with a single Gemini call."""
+    record = RequestRecord("process_exercise", gradeCode, chapterNo, exerciseCode)
+    try:
+        pdf_text = await load_pdf_text(pdf_file, doc_id, record)
+        prompt, prompt_version = resolve_prompt(prompt, promptTemplateId, promptTemplateVersion, promptParams)
+        record.prompt_version = prompt_version
+        logger.info(f"Parameters - Board: {board}, Source: {source}, Subject: {subjectCode}, Grade: {gradeCode}, Topic: {topicCode}, Chapter: {chapterNo}, Exercise: {exerciseCode}, Chunk size: {chunkSize}, Prompt version: {prompt_version}")
+
+        next_question_number = await run_state(record, get_next_question_number, board, source, subjectCode, gradeCode, topicCode, chapterNo)
+        if next_question_number == "END":
+            logger.info("Processed till last question.")
+            record.outcome = "end"
+            return {"status": "END", "questions": [], "promptVersion": prompt_version}
+        question_numbers = get_question_numbers_from(next_question_number, max(1, chunkSize))
+        record.question_numbers = question_numbers
+        fields = {
+            "status": status,
+            "gradeCode": gradeCode,
+            "subjectCode": subjectCode,
+            "topicCode": topicCode,
+            "postedByUserId": postedByUserId,
+            "board": board,
+            "source": source,
+            "chapterNo": chapterNo,
+            "exerciseCode": exerciseCode
+        }
+
+        batch_instruction = f"""Pick up question numbers {", ".join(question_numbers)}.
+                     Ignore any instruction to provide only one question.
+                     Provide one <question> element per question, in the same order, all wrapped in a single <questions> root element."""
+        final_prompt, context, prompt_tokens = await fit_prompt(prompt, prompt_version, pdf_text, question_numbers, batch_instruction)
+        logger.info(f"Generated batch prompt for Gemini covering {len(question_numbers)} questions")
+
+        try:
+            cache_key = build_response_cache_key(prompt_version, pdf_text, ",".join(question_numbers))
+            # Only a response with the first requested number parses; the rest are matched by questionNo
+            matched = await generate_parsed(
+                final_prompt,
+                cache_key,
+                lambda response_text: match_questions(question_numbers, extract_fields_from_xml(response_text, multiple=True)),
+                bypassCache,
+                caller=f"{gradeCode}/{exerciseCode}",
+                context=context,
+                record=record,
+                prompt_tokens=prompt_tokens,
+                instruction=batch_instruction
+            )
         except ValueError as e:
             logger.error(f"Error processing XML response: {e}")
             raise HTTPException(status_code=500, detail=str(e))
         except Exception as e:
-            logger.error(f"Error processing request: {e}")
-            raise HTTPException(status_code=500, detail=f"Error processing request: {e}")
+            logger.error(f"Error generating questions: {e}")
+            raise HTTPException(status_code=500, detail=f"Error generating questions: {e}")
+
+        created = []
+        for question_number, json_data in matched:
+            try:
+                created.append(await persist_question(record, question_number, json_data, fields, prompt_version))
+            except Exception as e:
+                logger.error(f"Error creating question {question_number} via API: {e}")
+                raise HTTPException(status_code=500, detail=f"Error creating question {question_number} after {len(created)} created: {e}")
+
+        return {"status": "OK", "questions": created, "promptVersion": prompt_version}
     except Exception as e:
-        logger.error(f"Error processing request: {e}")
-        raise HTTPException(status_code=500, detail=f"Error processing request: {e}")
+        record.fail(e)
+        raise
+    finally:
+        # Link whatever was created, even when the batch failed part way
+        await flush_links(record)
+        await finish_request(record)
+
+@app.post("/run_exercise")
+async def run_exercise(
+    pdf_file: Optional[UploadFile] = File(None),
+    doc_id: Optional[str] = Form(None),
+    prompt: Optional[str] = Form(None),
+    promptTemplateId: Optional[str] = Form(None),
+    promptTemplateVersion: Optional[str] = Form(None),
+    promptParams: Optional[str] = Form(None),
+    status: str = Form(...),
+    gradeCode: str = Form(...),
+    subjectCode: str = Form(...),
+    topicCode: str = Form(...),
+    postedByUserId: str = Form(...),
+    board: str = Form(...),
+    source: str = Form(...),
+    chapterNo: str = Form(...),
+    exerciseCode: str = Form(...),
+    maxQuestions: int = Form(PIPELINE_MAX_QUESTIONS),
+    bypassCache: bool = Form(False)
+):
+    """
+    Solve up to maxQuestions questions of the exercise one per Gemini call,
+    generating the next questions while the current one is being created.
+    """
+    record = RequestRecord("run_exercise", gradeCode, chapterNo, exerciseCode)
+    try:
+        pdf_text = await load_pdf_text(pdf_file, doc_id, record)
+        prompt, prompt_version = resolve_prompt(prompt, promptTemplateId, promptTemplateVersion, promptParams)
+        record.prompt_version = prompt_version
+        logger.info(f"Parameters - Board: {board}, Source: {source}, Subject: {subjectCode}, Grade: {gradeCode}, Topic: {topicCode}, Chapter: {chapterNo}, Exercise: {exerciseCode}, Max questions: {maxQuestions}, Prompt version: {prompt_version}")
+
+        next_question_number = await run_state(record, get_next_question_number, board, source, subjectCode, gradeCode, topicCode, chapterNo)
+        if next_question_number == "END":
+            logger.info("Processed till last question.")
+            record.outcome = "end"
+            return {"status": "END", "questions": [], "promptVersion": prompt_version}
+        question_numbers = get_question_numbers_from(next_question_number, max(1, maxQuestions))
+        record.question_numbers = question_numbers
+        fields = {
+            "status": status,
+            "gradeCode": gradeCode,
+            "subjectCode": subjectCode,
+            "topicCode": topicCode,
+            "postedByUserId": postedByUserId,
+            "board": board,
+            "source": source,
+            "chapterNo": chapterNo,
+            "exerciseCode": exerciseCode
+        }
+
+        async def generate(question_number):
+            question_instruction = f"Pick up question number {question_number}"
+            final_prompt, context, prompt_tokens = await fit_prompt(prompt, prompt_version, pdf_text, [question_number], question_instruction)
+            cache_key = build_response_cache_key(prompt_version, pdf_text, question_number)
+            return await generate_parsed(final_prompt, cache_key, parse_question_for(question_number), bypassCache, caller=f"{gradeCode}/{exerciseCode}", context=context, record=record, prompt_tokens=prompt_tokens, instruction=question_instruction)
+
+        async def persist(question_number, json_data):
+            formatted_json = await persist_question(record, question_number, json_data, fields, prompt_version)
+            created.append(formatted_json)
+            return formatted_json
+
+        created = []
+        try:
+            await pipeline_runner.run(question_numbers, generate, persist)
+        except Exception as e:
+            logger.error(f"Error processing exercise after {len(created)} questions created: {e}")
+            raise HTTPException(status_code=500, detail=f"Error processing exercise after {len(created)} questions created: {e}")
+
+        finished = len(question_numbers) < max(1, maxQuestions)
+        return {"status": "END" if finished else "OK", "questions": created, "promptVersion": prompt_version}
+    except Exception as e:
+        record.fail(e)
+        raise
+    finally:
+        # Link whatever was created, even when the batch failed part way
+        await flush_links(record)
+        await finish_request(record)
 
 def format_question_json(json_data, status, gradeCode, subjectCode, topicCode, postedByUserId, board, source, chapterNo, seqNumber, exerciseCode):
     """Format the question JSON with additional metadata."""
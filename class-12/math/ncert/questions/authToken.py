@@ -0,0 +1,126 @@
+import base64
+import json
+import logging
+import os
+import threading
+import time
+
+from httpClient import http_client
+
+logger = logging.getLogger(__name__)
+
+# Lifetime assumed for a token that carries no exp claim
+AUTH_TOKEN_TTL_SECONDS = float(os.getenv('AUTH_TOKEN_TTL_SECONDS', '3600'))
+# A token this close to expiry is refreshed by the next caller
+AUTH_TOKEN_REFRESH_MARGIN_SECONDS = float(os.getenv('AUTH_TOKEN_REFRESH_MARGIN_SECONDS', '60'))
+
+
+def token_expiry(token):
+    """Return the exp claim (epoch seconds) of a JWT, or None if token is not a JWT with one."""
+    try:
+        payload = token.split(".")[1]
+        claims = json.loads(base64.urlsafe_b64decode(payload + "=" * (-len(payload) % 4)))
+        return float(claims["exp"])
+    except (IndexError, KeyError, TypeError, ValueError):
+        return None
+
+
+class TokenProvider:
+    """
+    Process-wide bearer token for the question API, logged in once and reused.
+
+    The token is refreshed when it comes within refresh_margin (at most half
+    its lifetime) of its expiry, taken from its exp claim or assumed to be ttl
+    after login. Only one caller logs in at a time: while a still valid token
+    is being refreshed the other callers keep using it, and once it has
+    expired they wait for the new one.
+    """
+
+    def __init__(self, ttl=AUTH_TOKEN_TTL_SECONDS, refresh_margin=AUTH_TOKEN_REFRESH_MARGIN_SECONDS):
+        self.ttl = ttl
+        self.refresh_margin = refresh_margin
+        self._token = None
+        self._expires_at = 0.0
+        self._refresh_at = 0.0
+        self._lock = threading.Lock()
+        self.logins = 0
+        self.hits = 0
+        self.invalidations = 0
+
+    def _fresh(self):
+        return self._token is not None and time.time() < self._refresh_at
+
+    def get_token(self):
+        """Return a valid bearer token, logging in only when there is none or it is about to expire."""
+        token, expires_at = self._token, self._expires_at
+        if self._fresh():
+            self.hits += 1
+            return token
+        if token is not None and time.time() < expires_at:
+            if not self._lock.acquire(blocking=False):
+                # Another caller is already refreshing, this token is still valid meanwhile
+                self.hits += 1
+                return token
+        else:
+            self._lock.acquire()
+        try:
+            if self._fresh():
+                self.hits += 1
+                return self._token
+            return self._login()
+        finally:
+            self._lock.release()
+
+    def invalidate(self, token):
+        """Drop token after the API rejected it, so the next caller logs in again."""
+        if self._token == token:
+            self.invalidations += 1
+            self._token = None
+            self._expires_at = self._refresh_at = 0.0
+            logger.warning("Cached login token was rejected, logging in again")
+
+    def _login(self):
+        login_url = os.getenv('LOGIN_API_URL')
+        email = os.getenv('API_EMAIL')
+        password = os.getenv('API_PASSWORD')
+
+        if not all([login_url, email, password]):
+            raise Exception("Missing required environment variables for login")
+
+        login_headers = {
+            'Content-Type': 'application/json',
+            'Accept-Language': 'en',
+            'Timezone': 'Asia/Kolkata'
+        }
+        login_data = {
+            "email": email,
+            "password": password
+        }
+
+        logger.info("Attempting to login...")
+        login_response = http_client.post(login_url, headers=login_headers, json=login_data)
+        login_response.raise_for_status()
+        token = login_response.json().get('data', {}).get('token')
+        if not token:
+            raise Exception("No token received from login API")
+
+        self.logins += 1
+        now = time.time()
+        self._expires_at = token_expiry(token) or now + self.ttl
+        # Short-lived tokens are still used for half their lifetime before being refreshed
+        self._refresh_at = self._expires_at - min(self.refresh_margin, (self._expires_at - now) / 2)
+        self._token = token
+        logger.info(f"Successfully logged in, token valid for {self._expires_at - now:.0f} seconds")
+        return token
+
+    def stats(self):
+        """Return logins, cached token uses, rejected tokens and the seconds left on the current token."""
+        return {
+            "logins": self.logins,
+            "hits": self.hits,
+            "invalidations": self.invalidations,
+            "expiresInSeconds": round(max(0.0, self._expires_at - time.time()), 1) if self._token else None
+        }
+
+
+token_provider = TokenProvider()
@@ -0,0 +1,209 @@
+import asyncio
+import datetime
+import itertools
+import logging
+import os
+import time
+from collections import OrderedDict
+
+from fastapi.concurrency import run_in_threadpool
+
+from llmBackend import fake_response_xml, usage_from
+from questionIndex import estimate_tokens
+
+logger = logging.getLogger(__name__)
+
+GEMINI_CONTEXT_CACHE = os.getenv('GEMINI_CONTEXT_CACHE', 'off')
+GEMINI_CONTEXT_CACHE_TTL_SECONDS = int(os.getenv('GEMINI_CONTEXT_CACHE_TTL_SECONDS', '3600'))
+GEMINI_CONTEXT_CACHE_MAX_ENTRIES = int(os.getenv('GEMINI_CONTEXT_CACHE_MAX_ENTRIES', '8'))
+# Smallest prefix the model accepts for caching; shorter prefixes are sent inline
+GEMINI_CONTEXT_CACHE_MIN_TOKENS = int(os.getenv('GEMINI_CONTEXT_CACHE_MIN_TOKENS', '4096'))
+
+# Treat entries as expired slightly early so a call never races the server-side expiry
+EXPIRY_MARGIN_SECONDS = 60
+
+
+class CachedPrefix:
+    """A prefix cached by a backend, valid until expires_at (monotonic seconds)."""
+
+    def __init__(self, name, handle, expires_at):
+        self.name = name
+        self.handle = handle
+        self.expires_at = expires_at
+
+
+class GeminiContextCacheBackend:
+    """Caches prefixes with Gemini's cached-content API."""
+
+    name = "gemini"
+
+    def __init__(self, model_name):
+        self.model_name = model_name
+
+    async def create(self, display_name, prefix, ttl_seconds):
+        from google.generativeai import caching
+        cached_content = await run_in_threadpool(
+            caching.CachedContent.create,
+            model=f"models/{self.model_name}",
+            display_name=display_name,
+            contents=[prefix],
+            ttl=datetime.timedelta(seconds=ttl_seconds)
+        )
+        return cached_content.name, cached_content
+
+    async def generate(self, handle, suffix):
+        import google.generativeai as genai
+        model = genai.GenerativeModel.from_cached_content(cached_content=handle)
+        response = await model.generate_content_async(suffix)
+        logger.info(f"Received response from Gemini using cached content {handle.name}: {response}")
+        return response.text, usage_from(response)
+
+    async def delete(self, handle):
+        await run_in_threadpool(handle.delete)
+
+
+class FakeContextCacheBackend:
+    """
+    In-memory stand-in for the cached-content API, for exercising the cache
+    lifecycle offline. generate returns canned schema-valid question XML.
+    """
+
+    name = "fake"
+
+    def __init__(self):
+        self._ids = itertools.count(1)
+        self.prefixes = {}
+        self.created = 0
+        self.deleted = 0
+
+    async def create(self, display_name, prefix, ttl_seconds):
+        name = f"cachedContents/fake-{next(self._ids)}"
+        self.prefixes[name] = prefix
+        self.created += 1
+        return name, name
+
+    async def generate(self, handle, suffix):
+        if handle not in self.prefixes:
+            raise ValueError(f"Unknown cached content: {handle}")
+        response_text = fake_response_xml(suffix)
+        return response_text, (estimate_tokens(self.prefixes[handle]) + estimate_tokens(suffix), estimate_tokens(response_text))
+
+    async def delete(self, handle):
+        self.prefixes.pop(handle, None)
+        self.deleted += 1
+
+
+class ContextCacheManager:
+    """
+    Caches the shared prompt prefix (instructions plus PDF text) once per
+    (document, prompt version) so later calls send only the short suffix.
+
+    Entries are recreated after ttl_seconds and the least recently used
+    entry is deleted when more than max_entries are live. Prefixes under
+    min_tokens are never cached, and a key whose cache could not be created
+    is not tried again for ttl_seconds.
+    """
+
+    def __init__(self, backend, ttl_seconds=GEMINI_CONTEXT_CACHE_TTL_SECONDS, max_entries=GEMINI_CONTEXT_CACHE_MAX_ENTRIES,
+                 min_tokens=GEMINI_CONTEXT_CACHE_MIN_TOKENS):
+        self.backend = backend
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.min_tokens = min_tokens
+        self._entries = OrderedDict()
+        self._failed = {}
+        self._locks = {}
+        self.creates = 0
+        self.reuses = 0
+        self.expirations = 0
+        self.evictions = 0
+        self.failures = 0
+        self.skipped = 0
+
+    def cacheable(self, key, prefix):
+        """Return False when prefix is too short to cache or key failed to cache within the last ttl_seconds."""
+        if key in self._entries:
+            return True
+        if estimate_tokens(prefix) < self.min_tokens:
+            return False
+        failed_until = self._failed.get(key)
+        if failed_until is not None:
+            if time.monotonic() < failed_until:
+                return False
+            del self._failed[key]
+        return True
+
+    async def get_or_create(self, key, prefix):
+        """Return the live CachedPrefix for key, creating it if needed, or None if it cannot be cached."""
+        if not self.cacheable(key, prefix):
+            self.skipped += 1
+            return None
+        lock = self._locks.setdefault(key, asyncio.Lock())
+        async with lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                if time.monotonic() < entry.expires_at:
+                    self._entries.move_to_end(key)
+                    self.reuses += 1
+                    return entry
+                del self._entries[key]
+                self.expirations += 1
+                logger.info(f"Context cache entry {entry.name} expired")
+            if not self.cacheable(key, prefix):
+                # Another call failed to create it while this one waited
+                self.skipped += 1
+                return None
+
+            try:
+                name, handle = await self.backend.create(key, prefix, self.ttl_seconds)
+            except Exception as e:
+                self.failures += 1
+                self._failed[key] = time.monotonic() + self.ttl_seconds
+                logger.warning(f"Could not create context cache for {key}, not retrying for {self.ttl_seconds}s: {e}")
+                return None
+
+            entry = CachedPrefix(name, handle, time.monotonic() + self.ttl_seconds - EXPIRY_MARGIN_SECONDS)
+            self._entries[key] = entry
+            self.creates += 1
+            logger.info(f"Created context cache entry {name} for {key}")
+
+        await self._evict()
+        return entry
+
+    async def _evict(self):
+        while len(self._entries) > self.max_entries:
+            key, entry = self._entries.popitem(last=False)
+            self.evictions += 1
+            try:
+                await self.backend.delete(entry.handle)
+                logger.info(f"Evicted context cache entry {entry.name} for {key}")
+            except Exception as e:
+                logger.warning(f"Error deleting context cache entry {entry.name}: {e}")
+
+    async def generate(self, entry, suffix):
+        """Return (response_text, usage) for suffix on top of the cached prefix."""
+        return await self.backend.generate(entry.handle, suffix)
+
+    def stats(self):
+        """Return lifecycle counters and the number of live entries."""
+        return {
+            "backend": self.backend.name,
+            "entries": len(self._entries),
+            "creates": self.creates,
+            "reuses": self.reuses,
+            "expirations": self.expirations,
+            "evictions": self.evictions,
+            "failures": self.failures,
+            "skipped": self.skipped
+        }
+
+
+def get_context_cache(mode=GEMINI_CONTEXT_CACHE, model_name=None):
+    """Build the context cache selected by GEMINI_CONTEXT_CACHE (off, gemini or fake), or None when off."""
+    if mode == "off":
+        return None
+    if mode == GeminiContextCacheBackend.name:
+        return ContextCacheManager(GeminiContextCacheBackend(model_name))
+    if mode == FakeContextCacheBackend.name:
+        return ContextCacheManager(FakeContextCacheBackend())
+    raise ValueError(f"Unknown GEMINI_CONTEXT_CACHE mode: {mode}. Expected off, gemini or fake")
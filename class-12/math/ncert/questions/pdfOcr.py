@@ -0,0 +1,121 @@
+import hashlib
+import logging
+import os
+import string
+
+import PyPDF2
+import pytesseract
+from pdf2image import convert_from_path
+from PyPDF2.generic import ArrayObject
+
+from pdfCache import PDF_CACHE_DIR, PdfTextCache
+
+logger = logging.getLogger(__name__)
+
+PDF_OCR_ENABLED = os.getenv('PDF_OCR_ENABLED', 'true').lower() == 'true'
+PDF_OCR_MIN_CHARS = int(os.getenv('PDF_OCR_MIN_CHARS', '20'))
+PDF_OCR_QUALITY_THRESHOLD = float(os.getenv('PDF_OCR_QUALITY_THRESHOLD', '0.6'))
+PDF_OCR_DPI = int(os.getenv('PDF_OCR_DPI', '300'))
+PDF_OCR_LANG = os.getenv('PDF_OCR_LANG', 'eng')
+PDF_OCR_CACHE_DIR = os.getenv('PDF_OCR_CACHE_DIR', os.path.join(PDF_CACHE_DIR, 'ocr'))
+
+OCR_VERSION = f"tesseract-{PDF_OCR_LANG}-{PDF_OCR_DPI}dpi"
+
+_READABLE_CHARS = set(string.ascii_letters + string.digits + string.whitespace + string.punctuation + "−×÷±≤≥≠√πθ°")
+
+
+def text_quality(text):
+    """Score extracted page text between 0 (empty or garbled) and 1 (readable)."""
+    stripped = text.strip()
+    if len(stripped) < PDF_OCR_MIN_CHARS:
+        return 0.0
+    readable = sum(1 for ch in stripped if ch in _READABLE_CHARS)
+    return readable / len(stripped)
+
+
+def _hash_xobjects(resources, digest, depth=0):
+    """Add the images and forms drawn from resources to digest, following nested forms."""
+    if resources is None or depth > 8:
+        return
+    xobjects = resources.get_object().get('/XObject')
+    if xobjects is None:
+        return
+    xobjects = xobjects.get_object()
+    for name in sorted(xobjects):
+        xobject = xobjects[name].get_object()
+        digest.update(name.encode())
+        digest.update(xobject.get_data())
+        _hash_xobjects(xobject.get('/Resources'), digest, depth + 1)
+
+
+def hash_page(page):
+    """
+    Return the SHA-256 of what a PyPDF2 page draws: its size, rotation,
+    content streams and the images and forms they reference.
+
+    The same page in an exercise PDF and in its chapter PDF has the same hash.
+    """
+    digest = hashlib.sha256()
+    digest.update(f"{list(page.mediabox)}-{page.get('/Rotate', 0)}".encode())
+    contents = page.get('/Contents')
+    contents = contents.get_object() if contents is not None else []
+    for stream in (contents if isinstance(contents, ArrayObject) else [contents]):
+        digest.update(stream.get_object().get_data())
+    _hash_xobjects(page.get('/Resources'), digest)
+    return digest.hexdigest()
+
+
+def ocr_page(pdf_path, page_index, dpi=PDF_OCR_DPI, lang=PDF_OCR_LANG):
+    """Rasterize one page and OCR it. Runs in pool workers."""
+    images = convert_from_path(pdf_path, dpi=dpi, first_page=page_index + 1, last_page=page_index + 1)
+    return "\n".join(pytesseract.image_to_string(image, lang=lang) for image in images)
+
+
+class OcrFallback:
+    """
+    Replaces weak page text with OCR output.
+
+    Only pages scoring below quality_threshold are rasterized and OCR'd, in
+    parallel on the given process pool. Results are cached per page, keyed by
+    the page content hash and OCR settings, so a page shared by several PDFs
+    is OCR'd once.
+    """
+
+    def __init__(self, quality_threshold=PDF_OCR_QUALITY_THRESHOLD, cache=None):
+        self.quality_threshold = quality_threshold
+        self.cache = cache or PdfTextCache(cache_dir=PDF_OCR_CACHE_DIR)
+
+    def repair(self, pdf_path, pages, pool):
+        """Return pages with weak entries replaced by OCR text where it helps."""
+        weak_pages = [i for i, text in enumerate(pages) if text_quality(text) < self.quality_threshold]
+        if not weak_pages:
+            return pages
+
+        logger.info(f"Running OCR fallback on {len(weak_pages)} of {len(pages)} pages of PDF: {pdf_path}")
+        with open(pdf_path, 'rb') as f:
+            reader = PyPDF2.PdfReader(f)
+            page_hashes = {i: hash_page(reader.pages[i]) for i in weak_pages}
+        repaired = list(pages)
+        futures = {}
+        for i in weak_pages:
+            key = f"{page_hashes[i]}-{OCR_VERSION}"
+            cached_text = self.cache.get(key)
+            if cached_text is not None:
+                repaired[i] = self._better(pages[i], cached_text)
+            else:
+                futures[i] = (key, pool.submit(ocr_page, pdf_path, i))
+
+        for i, (key, future) in futures.items():
+            try:
+                ocr_text = future.result()
+            except Exception as e:
+                logger.error(f"OCR failed for page {i + 1} of PDF {pdf_path}: {e}")
+                continue
+            self.cache.put(key, ocr_text)
+            repaired[i] = self._better(pages[i], ocr_text)
+
+        logger.info(f"OCR cache stats: {self.cache.stats()}")
+        return repaired
+
+    def _better(self, original, ocr_text):
+        return ocr_text if text_quality(ocr_text) > text_quality(original) else original
@@ -0,0 +1,173 @@
+import logging
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+REQUEST_STATS_ENABLED = os.getenv('REQUEST_STATS_ENABLED', 'true').lower() == 'true'
+REQUEST_STATS_PATH = os.getenv('REQUEST_STATS_PATH', '.request_stats.sqlite3')
+
+STAGES = ("upload", "extraction", "generation", "parse", "login", "create", "link", "state")
+
+# Request fields that /stats can filter and group by, mapped to their columns
+GROUP_COLUMNS = {
+    "endpoint": "endpoint",
+    "gradeCode": "grade_code",
+    "chapterNo": "chapter_no",
+    "exerciseCode": "exercise_code",
+    "promptVersion": "prompt_version",
+    "outcome": "outcome"
+}
+
+
+class RequestRecord:
+    """Token counts, per-stage durations and outcome of one generation request."""
+
+    def __init__(self, endpoint, grade_code=None, chapter_no=None, exercise_code=None, prompt_version=None):
+        self.endpoint = endpoint
+        self.grade_code = grade_code
+        self.chapter_no = chapter_no
+        self.exercise_code = exercise_code
+        self.prompt_version = prompt_version
+        self.question_numbers = []
+        self.questions = 0
+        self.outcome = "ok"
+        self.error = None
+        self.llm_calls = 0
+        self.prompt_tokens = 0
+        self.candidate_tokens = 0
+        self.stages = dict.fromkeys(STAGES, 0.0)
+        self.started_at = time.monotonic()
+        self.total_seconds = None
+
+    @contextmanager
+    def stage(self, name):
+        """Add the duration of the block to stage name."""
+        started_at = time.monotonic()
+        try:
+            yield
+        finally:
+            self.add_stage(name, time.monotonic() - started_at)
+
+    def add_stage(self, name, seconds):
+        self.stages[name] = self.stages.get(name, 0.0) + seconds
+
+    def add_stages(self, timings):
+        for name, seconds in timings.items():
+            self.add_stage(name, seconds)
+
+    def add_usage(self, attempt_log):
+        """Add the calls and token counts of one generation."""
+        self.llm_calls += attempt_log.calls
+        self.prompt_tokens += attempt_log.prompt_tokens
+        self.candidate_tokens += attempt_log.candidate_tokens
+
+    def fail(self, error):
+        self.outcome = "error"
+        self.error = str(getattr(error, 'detail', error))[:500]
+
+    def finish(self):
+        if self.total_seconds is None:
+            self.total_seconds = time.monotonic() - self.started_at
+
+
+class RequestStatsStore:
+    """
+    SQLite store of RequestRecords, one row per request, with one column per
+    stage so it can be queried directly as well as through aggregate.
+    """
+
+    def __init__(self, path=REQUEST_STATS_PATH, enabled=REQUEST_STATS_ENABLED):
+        self.path = path
+        self.enabled = enabled
+        self._lock = threading.Lock()
+        if self.enabled:
+            stage_columns = "".join(f", {stage}_seconds REAL NOT NULL DEFAULT 0" for stage in STAGES)
+            with self._connect() as conn:
+                conn.execute(
+                    "CREATE TABLE IF NOT EXISTS requests ("
+                    "id INTEGER PRIMARY KEY AUTOINCREMENT, created_at REAL NOT NULL, endpoint TEXT NOT NULL, "
+                    "grade_code TEXT, chapter_no TEXT, exercise_code TEXT, prompt_version TEXT, "
+                    "question_numbers TEXT, questions INTEGER NOT NULL, outcome TEXT NOT NULL, error TEXT, "
+                    "llm_calls INTEGER NOT NULL, prompt_tokens INTEGER NOT NULL, candidate_tokens INTEGER NOT NULL, "
+                    f"total_seconds REAL NOT NULL{stage_columns})"
+                )
+                conn.execute("CREATE INDEX IF NOT EXISTS requests_created_at ON requests (created_at)")
+
+    def _connect(self):
+        return sqlite3.connect(self.path, timeout=30)
+
+    def record(self, record):
+        """Store a finished request."""
+        if not self.enabled:
+            return
+        record.finish()
+        columns = ["created_at", "endpoint", "grade_code", "chapter_no", "exercise_code", "prompt_version",
+                   "question_numbers", "questions", "outcome", "error", "llm_calls", "prompt_tokens",
+                   "candidate_tokens", "total_seconds"] + [f"{stage}_seconds" for stage in STAGES]
+        values = [time.time(), record.endpoint, record.grade_code, record.chapter_no, record.exercise_code,
+                  record.prompt_version, ",".join(record.question_numbers), record.questions, record.outcome,
+                  record.error, record.llm_calls, record.prompt_tokens, record.candidate_tokens,
+                  record.total_seconds] + [record.stages.get(stage, 0.0) for stage in STAGES]
+        try:
+            with self._lock, self._connect() as conn:
+                conn.execute(
+                    f"INSERT INTO requests ({', '.join(columns)}) VALUES ({', '.join('?' * len(columns))})",
+                    values
+                )
+        except Exception as e:
+            logger.error(f"Error writing request stats: {e}")
+
+    def aggregate(self, group_by, filters=None, since=None):
+        """
+        Return totals per group of the GROUP_COLUMNS fields in group_by, for
+        requests matching filters (field -> value) created after since (epoch seconds).
+        """
+        unknown = [field for field in list(group_by) + list(filters or {}) if field not in GROUP_COLUMNS]
+        if unknown:
+            raise ValueError(f"Unknown stats fields {unknown}. Expected some of {sorted(GROUP_COLUMNS)}")
+        if not self.enabled:
+            return []
+
+        where, params = [], []
+        for field, value in (filters or {}).items():
+            where.append(f"{GROUP_COLUMNS[field]} = ?")
+            params.append(value)
+        if since is not None:
+            where.append("created_at >= ?")
+            params.append(since)
+        group_columns = [GROUP_COLUMNS[field] for field in group_by]
+        stage_sums = "".join(f", SUM({stage}_seconds)" for stage in STAGES)
+        query = (
+            f"SELECT {''.join(column + ', ' for column in group_columns)}"
+            "COUNT(*), SUM(outcome = 'error'), SUM(questions), SUM(llm_calls), SUM(prompt_tokens), "
+            f"SUM(candidate_tokens), SUM(total_seconds){stage_sums} FROM requests"
+            + (f" WHERE {' AND '.join(where)}" if where else "")
+            + (f" GROUP BY {', '.join(group_columns)} ORDER BY {', '.join(group_columns)}" if group_columns else "")
+        )
+        with self._connect() as conn:
+            rows = conn.execute(query, params).fetchall()
+
+        groups = []
+        for row in rows:
+            keys, totals = row[:len(group_by)], row[len(group_by):]
+            requests, errors, questions, llm_calls, prompt_tokens, candidate_tokens, total_seconds = totals[:7]
+            if not requests:
+                continue
+            group = dict(zip(group_by, keys))
+            group.update({
+                "requests": requests,
+                "errors": errors,
+                "questions": questions,
+                "llmCalls": llm_calls,
+                "promptTokens": prompt_tokens,
+                "candidateTokens": candidate_tokens,
+                "totalSeconds": round(total_seconds, 3),
+                "averageSeconds": round(total_seconds / requests, 3),
+                "stageSeconds": {stage: round(seconds, 3) for stage, seconds in zip(STAGES, totals[7:])}
+            })
+            groups.append(group)
+        return groups
@@ -0,0 +1,119 @@
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+LLM_CACHE_ENABLED = os.getenv('LLM_CACHE_ENABLED', 'true').lower() == 'true'
+LLM_CACHE_PATH = os.getenv('LLM_CACHE_PATH', '.llm_cache.sqlite3')
+LLM_CACHE_TTL_SECONDS = int(os.getenv('LLM_CACHE_TTL_SECONDS', str(30 * 24 * 3600)))
+LLM_CACHE_MAX_ENTRIES = int(os.getenv('LLM_CACHE_MAX_ENTRIES', '5000'))
+
+
+def hash_text(text):
+    """Return the SHA-256 hex digest of text."""
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+
+class LlmResponseCache:
+    """
+    Disk-backed cache of LLM response text.
+
+    Entries expire after ttl_seconds. When more than max_entries are stored,
+    the least recently used entries are evicted.
+    """
+
+    def __init__(self, path=LLM_CACHE_PATH, ttl_seconds=LLM_CACHE_TTL_SECONDS, max_entries=LLM_CACHE_MAX_ENTRIES, enabled=LLM_CACHE_ENABLED):
+        self.path = path
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.enabled = enabled
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.bypasses = 0
+        if self.enabled:
+            with self._connect() as conn:
+                conn.execute(
+                    "CREATE TABLE IF NOT EXISTS responses ("
+                    "key TEXT PRIMARY KEY, response TEXT NOT NULL, "
+                    "created_at REAL NOT NULL, accessed_at REAL NOT NULL)"
+                )
+                conn.execute("CREATE INDEX IF NOT EXISTS responses_accessed_at ON responses (accessed_at)")
+
+    def _connect(self):
+        return sqlite3.connect(self.path, timeout=30)
+
+    @staticmethod
+    def make_key(prompt_version, document_hash, question_number, model_name, generation_config):
+        """Build the cache key from everything that determines the response."""
+        parts = {
+            "promptVersion": prompt_version,
+            "documentHash": document_hash,
+            "questionNumber": str(question_number),
+            "modelName": model_name,
+            "generationConfig": generation_config or {}
+        }
+        return hash_text(json.dumps(parts, sort_keys=True))
+
+    def get(self, key):
+        """Return the cached response for key, or None if missing or expired."""
+        if not self.enabled:
+            return None
+        now = time.time()
+        with self._lock, self._connect() as conn:
+            row = conn.execute("SELECT response, created_at FROM responses WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            response, created_at = row
+            if now - created_at > self.ttl_seconds:
+                conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+                self.misses += 1
+                return None
+            conn.execute("UPDATE responses SET accessed_at = ? WHERE key = ?", (now, key))
+            self.hits += 1
+            return response
+
+    def put(self, key, response):
+        """Store response for key and evict expired and least recently used entries."""
+        if not self.enabled:
+            return
+        now = time.time()
+        try:
+            with self._lock, self._connect() as conn:
+                conn.execute(
+                    "INSERT OR REPLACE INTO responses (key, response, created_at, accessed_at) VALUES (?, ?, ?, ?)",
+                    (key, response, now, now)
+                )
+                conn.execute("DELETE FROM responses WHERE created_at < ?", (now - self.ttl_seconds,))
+                conn.execute(
+                    "DELETE FROM responses WHERE key IN ("
+                    "SELECT key FROM responses ORDER BY accessed_at DESC LIMIT -1 OFFSET ?)",
+                    (self.max_entries,)
+                )
+        except Exception as e:
+            logger.error(f"Error writing LLM response cache: {e}")
+
+    def record_bypass(self):
+        """Count a lookup skipped at the caller's request."""
+        with self._lock:
+            self.bypasses += 1
+
+    def stats(self):
+        """Return hit/miss counters and the number of stored entries."""
+        entries = 0
+        if self.enabled:
+            with self._connect() as conn:
+                entries = conn.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+        return {
+            "enabled": self.enabled,
+            "hits": self.hits,
+            "misses": self.misses,
+            "bypasses": self.bypasses,
+            "entries": entries
+        }
@@ -1,12 +1,13 @@
 import requests
-import json
 import logging
-import os
 from dotenv import load_dotenv
 
-# Load environment variables
+# Load environment variables before the local modules below read their settings
 load_dotenv()
 
+from questionLinker import QuestionLinker
+from questionSink import get_question_sink
+
 # Configure logging
 logging.basicConfig(
     level=logging.INFO,
@@ -28,48 +29,21 @@ def store_question_id(question_id):
         logger.error(f"Error storing question ID: {e}")
         raise
 
-def createQuestion(formatted_json):
+def post_question(formatted_json, timings=None, idempotency_key=None):
     """
-    Creates a question by first logging in and then calling the create question API.
-    
+    Create a question through the configured question sink without linking it.
+
+    The question is chained after the one in previousQuestionId.txt.
+
     Args:
         formatted_json (dict): The formatted question JSON to be created
-        
+        timings (dict, optional): Receives seconds spent in login and create
+        idempotency_key (str, optional): Sent as the Idempotency-Key header so a retried create is not duplicated
+
     Returns:
-        dict: Response from the create question API
+        tuple: Response from the create question API and the previous question ID it was chained after
     """
     try:
-        # Get environment variables
-        login_url = os.getenv('LOGIN_API_URL')
-        question_url = os.getenv('QUESTION_API_URL')
-        email = os.getenv('API_EMAIL')
-        password = os.getenv('API_PASSWORD')
-        
-        if not all([login_url, question_url, email, password]):
-            raise Exception("Missing required environment variables")
-        
-        # Login API call
-        login_headers = {
-            'Content-Type': 'application/json',
-            'Accept-Language': 'en',
-            'Timezone': 'Asia/Kolkata'
-        }
-        login_data = {
-            "email": email,
-            "password": password
-        }
-        
-        logger.info("Attempting to login...")
-        login_response = requests.post(login_url, headers=login_headers, json=login_data)
-        login_response.raise_for_status()
-        login_data = login_response.json()
-        logger.info("Successfully logged in")
-        
-        # Extract token from login response
-        token = login_data.get('data', {}).get('token')
-        if not token:
-            raise Exception("No token received from login API")
-        
         # Read previous question ID from file store_question_id
         previous_question_id = ""
         try:
@@ -78,35 +52,15 @@ def createQuestion(formatted_json):
         except FileNotFoundError:
             logger.warning("No previous question ID found")
 
-        # Create Question API call
-        question_headers = {
-            'Accept-Language': 'en',
-            'Timezone': 'Asia/Kolkata',
-            'Content-Type': 'application/json',
-            'Authorization': f'Bearer {token}'
-        }
         # Add previous question ID to the formatted JSON if it exists
         if previous_question_id:
             formatted_json['previousQuestionId'] = previous_question_id
         
         logger.info("Attempting to create question...")
         print(f"Formatted JSON: {formatted_json}")
-        question_response = requests.post(question_url, headers=question_headers, json=formatted_json)
-        question_response.raise_for_status()
-        response_data = question_response.json()
+        response_data = question_sink.create(formatted_json, timings, idempotency_key)
         logger.info("Successfully created question")
-        
-        # Store the question ID
-        question_id = response_data.get('data', {}).get('id')
-        if question_id:
-            # Update next question id of the previous question
-            update_next_question_id_of_previous_question(previous_question_id, question_id)
-            store_question_id(question_id)
-
-        else:
-            logger.warning("No question ID found in response")
-        
-        return response_data
+        return response_data, previous_question_id
         
     except requests.exceptions.RequestException as e:
         logger.error(f"API request failed: {e}")
@@ -115,66 +69,50 @@ def createQuestion(formatted_json):
             logger.error(f"Response body: {e.response.text}")
         raise
     except Exception as e:
-        logger.error(f"Error in createQuestion: {e}")
+        logger.error(f"Error creating question: {e}")
         raise
 
-def update_next_question_id_of_previous_question(previous_question_id, next_question_id):
-    """Update the nextQuestionId of the previous question using PUT API."""
+def link_question(previous_question_id, question_id, timings=None):
+    """Link question_id after previous_question_id, now or when the batch is flushed, and store it as the previous question."""
+    if question_linker.deferred:
+        question_linker.add(previous_question_id, question_id)
+    else:
+        update_next_question_id_of_previous_question(previous_question_id, question_id, timings)
+    store_question_id(question_id)
+
+def createQuestion(formatted_json, timings=None, idempotency_key=None):
+    """
+    Creates a question through the configured question sink, the question API by default,
+    and links it to the previous question.
+    
+    Args:
+        formatted_json (dict): The formatted question JSON to be created
+        timings (dict, optional): Receives seconds spent in login, create and link
+        idempotency_key (str, optional): Sent as the Idempotency-Key header so a retried create is not duplicated
+        
+    Returns:
+        dict: Response from the create question API
+    """
+    response_data, previous_question_id = post_question(formatted_json, timings, idempotency_key)
+
+    # Store the question ID
+    question_id = response_data.get('data', {}).get('id')
+    if question_id:
+        link_question(previous_question_id, question_id, timings)
+    else:
+        logger.warning("No question ID found in response")
+
+    return response_data
+
+def update_next_question_id_of_previous_question(previous_question_id, next_question_id, timings=None):
+    """Update the nextQuestionId of the previous question through the question sink."""
     try:
         if not previous_question_id or not next_question_id:
             logger.warning("Missing question IDs for update")
             return
 
-        # Get environment variables
-        question_url = os.getenv('QUESTION_API_URL')
-        if not question_url:
-            raise Exception("Missing QUESTION_API_URL environment variable")
-
-        # Construct the update URL
-        update_url = f"{question_url}/{previous_question_id}"
-        
-        # Get token from login
-        login_url = os.getenv('LOGIN_API_URL')
-        email = os.getenv('API_EMAIL')
-        password = os.getenv('API_PASSWORD')
-        
-        if not all([login_url, email, password]):
-            raise Exception("Missing required environment variables for login")
-        
-        # Login to get token
-        login_headers = {
-            'Content-Type': 'application/json',
-            'Accept-Language': 'en',
-            'Timezone': 'Asia/Kolkata'
-        }
-        login_data = {
-            "email": email,
-            "password": password
-        }
-        
-        login_response = requests.post(login_url, headers=login_headers, json=login_data)
-        login_response.raise_for_status()
-        token = login_response.json().get('data', {}).get('token')
-        
-        if not token:
-            raise Exception("No token received from login API")
-        
-        # Update headers
-        update_headers = {
-            'Accept-Language': 'en',
-            'Timezone': 'Asia/Kolkata',
-            'Content-Type': 'application/json',
-            'Authorization': f'Bearer {token}'
-        }
-        
-        # Update payload
-        update_data = {
-            "nextQuestionId": next_question_id
-        }
-        
         logger.info(f"Updating nextQuestionId for question {previous_question_id} to {next_question_id}")
-        update_response = requests.put(update_url, headers=update_headers, json=update_data)
-        update_response.raise_for_status()
+        question_sink.link(previous_question_id, next_question_id, timings)
         
         logger.info(f"Successfully updated nextQuestionId for question {previous_question_id}")
         
@@ -187,3 +125,7 @@ def update_next_question_id_of_previous_question(previous_question_id, next_ques
     except Exception as e:
         logger.error(f"Error updating nextQuestionId: {e}")
         raise
+
+
+question_sink = get_question_sink()
+question_linker = QuestionLinker(update_next_question_id_of_previous_question)
@@ -0,0 +1,95 @@
+import asyncio
+import logging
+import os
+import threading
+import time
+from collections import deque
+
+logger = logging.getLogger(__name__)
+
+PIPELINE_PREFETCH_DEPTH = int(os.getenv('PIPELINE_PREFETCH_DEPTH', '2'))
+PIPELINE_MAX_QUESTIONS = int(os.getenv('PIPELINE_MAX_QUESTIONS', '100'))
+
+
+class PipelineRunner:
+    """
+    Overlaps generation of upcoming items with persistence of the current one.
+
+    generate(item) runs for up to prefetch_depth items ahead while
+    persist(item, result) commits items strictly in order, so per-item wall
+    time approaches the slower stage instead of the sum of both. The first
+    failure stops the run and cancels the generations still in flight.
+    """
+
+    def __init__(self, prefetch_depth=PIPELINE_PREFETCH_DEPTH):
+        self.prefetch_depth = max(1, prefetch_depth)
+        self._lock = threading.Lock()
+        self.runs = 0
+        self.items = 0
+        self.cancelled = 0
+        self.wall_seconds = 0.0
+        self.generate_seconds = 0.0
+        self.persist_seconds = 0.0
+
+    async def _timed_generate(self, generate, item):
+        started_at = time.monotonic()
+        try:
+            return await generate(item)
+        finally:
+            with self._lock:
+                self.generate_seconds += time.monotonic() - started_at
+
+    async def run(self, items, generate, persist):
+        """Return the persist results for items, in order."""
+        items = iter(items)
+        in_flight = deque()
+        results = []
+
+        def prefetch():
+            while len(in_flight) < self.prefetch_depth:
+                item = next(items, None)
+                if item is None:
+                    return
+                in_flight.append((item, asyncio.ensure_future(self._timed_generate(generate, item))))
+
+        started_at = time.monotonic()
+        try:
+            prefetch()
+            while in_flight:
+                item, task = in_flight.popleft()
+                result = await task
+                # Start the next generation before persisting this item
+                prefetch()
+                persist_started_at = time.monotonic()
+                try:
+                    results.append(await persist(item, result))
+                finally:
+                    with self._lock:
+                        self.persist_seconds += time.monotonic() - persist_started_at
+            return results
+        finally:
+            for item, task in in_flight:
+                task.cancel()
+            if in_flight:
+                logger.info(f"Cancelled {len(in_flight)} prefetched generations after persisting {len(results)} items")
+                await asyncio.gather(*(task for item, task in in_flight), return_exceptions=True)
+            with self._lock:
+                self.runs += 1
+                self.items += len(results)
+                self.cancelled += len(in_flight)
+                self.wall_seconds += time.monotonic() - started_at
+
+    def stats(self):
+        """Return per-stage totals and how much of their sum the overlap saved."""
+        with self._lock:
+            stage_seconds = self.generate_seconds + self.persist_seconds
+            return {
+                "prefetchDepth": self.prefetch_depth,
+                "runs": self.runs,
+                "items": self.items,
+                "cancelled": self.cancelled,
+                "wallSeconds": round(self.wall_seconds, 3),
+                "generateSeconds": round(self.generate_seconds, 3),
+                "persistSeconds": round(self.persist_seconds, 3),
+                "overlapRatio": round(1 - self.wall_seconds / stage_seconds, 4) if stage_seconds else 0.0
+            }
@@ -0,0 +1,59 @@
+import asyncio
+import logging
+import os
+
+logger = logging.getLogger(__name__)
+
+# How long a successful result is still shared with late duplicates, which
+# may have read the question number before the first request updated it
+SINGLE_FLIGHT_LINGER_SECONDS = float(os.getenv('SINGLE_FLIGHT_LINGER_SECONDS', '30'))
+
+
+class SingleFlight:
+    """
+    Runs at most one call per key at a time. Callers that arrive while a
+    call for the same key is in flight wait for it and share its result or
+    error instead of starting their own. Successful results keep being
+    shared for linger_seconds afterwards; failures are forgotten at once so
+    the next caller retries.
+
+    The call runs as its own task, so it still completes for the waiting
+    callers if the caller that started it disconnects.
+    """
+
+    def __init__(self, linger_seconds=SINGLE_FLIGHT_LINGER_SECONDS):
+        self.linger_seconds = linger_seconds
+        self._flights = {}
+        self.leaders = 0
+        self.shared = 0
+
+    def _forget(self, key, task):
+        if self._flights.get(key) is task:
+            del self._flights[key]
+
+    def _on_done(self, key, task):
+        if task.cancelled() or task.exception() is not None or self.linger_seconds <= 0:
+            self._forget(key, task)
+        else:
+            asyncio.get_running_loop().call_later(self.linger_seconds, self._forget, key, task)
+
+    async def run(self, key, func):
+        """Return await func(), or the result of the call already made for key."""
+        task = self._flights.get(key)
+        if task is not None:
+            self.shared += 1
+            logger.info(f"Sharing result of request {key}")
+        else:
+            self.leaders += 1
+            task = asyncio.ensure_future(func())
+            self._flights[key] = task
+            task.add_done_callback(lambda done: self._on_done(key, done))
+        return await asyncio.shield(task)
+
+    def stats(self):
+        """Return how many calls ran and how many duplicates shared a result."""
+        return {
+            "tracked": len(self._flights),
+            "leaders": self.leaders,
+            "shared": self.shared
+        }
@@ -0,0 +1,107 @@
+import asyncio
+import logging
+import os
+import random
+import threading
+
+from adaptiveConcurrency import is_throttle_error
+
+logger = logging.getLogger(__name__)
+
+GEMINI_MAX_ATTEMPTS = int(os.getenv('GEMINI_MAX_ATTEMPTS', '4'))
+GEMINI_RETRY_BASE_SECONDS = float(os.getenv('GEMINI_RETRY_BASE_SECONDS', '1'))
+GEMINI_RETRY_MAX_SECONDS = float(os.getenv('GEMINI_RETRY_MAX_SECONDS', '30'))
+GEMINI_REPAIR_ATTEMPTS = int(os.getenv('GEMINI_REPAIR_ATTEMPTS', '2'))
+
+TRANSIENT = "transient"
+PARSE = "parse"
+FATAL = "fatal"
+
+TRANSIENT_STATUS_CODES = (500, 502, 503, 504)
+
+
+def classify_error(error):
+    """Classify an error as transient (retry with backoff), parse (repair) or fatal."""
+    if is_throttle_error(error) or isinstance(error, (asyncio.TimeoutError, ConnectionError, TimeoutError)):
+        return TRANSIENT
+    try:
+        if int(getattr(error, 'code', None)) in TRANSIENT_STATUS_CODES:
+            return TRANSIENT
+    except (TypeError, ValueError):
+        pass
+    if isinstance(error, ValueError):
+        return PARSE
+    return FATAL
+
+
+def build_repair_prompt(broken_output, error, instruction=None):
+    """
+    Build a short prompt asking the model to fix its own malformed XML.
+
+    instruction, the request the response was for, is repeated so a repair of
+    output cut off before its <questionNo> still answers the same numbers.
+    """
+    request = f"\nThe response was for this request, which the corrected XML must still answer:\n{instruction}\n" if instruction else ""
+    return f"""The following response was supposed to be well-formed XML but could not be parsed: {error}
+Fix it and return only the corrected XML, keeping the same elements and content.
+Wrap text content in <![CDATA[...]]> where needed. Do not add any explanation.
+{request}
+{broken_output}"""
+
+
+class AttemptLog:
+    """Counts the model calls and tokens spent on one generation."""
+
+    def __init__(self):
+        self.calls = 0
+        self.repairs = 0
+        self.estimated_tokens = 0
+        self.prompt_tokens = 0
+        self.candidate_tokens = 0
+
+
+class RetryEngine:
+    """
+    Retries transient model errors with exponential backoff and full jitter,
+    and records attempt counts and estimated token cost per outcome.
+    """
+
+    def __init__(self, max_attempts=GEMINI_MAX_ATTEMPTS, base_delay=GEMINI_RETRY_BASE_SECONDS,
+                 max_delay=GEMINI_RETRY_MAX_SECONDS, repair_attempts=GEMINI_REPAIR_ATTEMPTS):
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.repair_attempts = repair_attempts
+        self._lock = threading.Lock()
+        self.outcomes = {}
+
+    def backoff_delay(self, attempt):
+        """Full-jitter delay before retry number attempt (1-based)."""
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2 ** (attempt - 1)))
+
+    async def run(self, func):
+        """Await func(), retrying transient errors up to max_attempts times."""
+        attempt = 0
+        while True:
+            attempt += 1
+            try:
+                return await func()
+            except Exception as e:
+                if classify_error(e) != TRANSIENT or attempt >= self.max_attempts:
+                    raise
+                delay = self.backoff_delay(attempt)
+                logger.warning(f"Transient error on attempt {attempt} of {self.max_attempts}: {e}. Retrying in {delay:.2f}s")
+                await asyncio.sleep(delay)
+
+    def record(self, outcome, attempt_log):
+        """Add one generation's calls and estimated tokens to the outcome totals."""
+        with self._lock:
+            totals = self.outcomes.setdefault(outcome, {"count": 0, "calls": 0, "estimatedTokens": 0})
+            totals["count"] += 1
+            totals["calls"] += attempt_log.calls
+            totals["estimatedTokens"] += attempt_log.estimated_tokens
+
+    def stats(self):
+        """Return counts, model calls and estimated tokens per outcome."""
+        with self._lock:
+            return {outcome: dict(totals) for outcome, totals in self.outcomes.items()}
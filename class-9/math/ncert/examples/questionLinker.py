@@ -0,0 +1,179 @@
+import json
+import logging
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+logger = logging.getLogger(__name__)
+
+# immediate links each question to the previous one right after it is created,
+# deferred records the links and applies them in bulk at the end of a batch
+QUESTION_LINK_MODE = os.getenv('QUESTION_LINK_MODE', 'immediate')
+QUESTION_LINK_CONCURRENCY = int(os.getenv('QUESTION_LINK_CONCURRENCY', '8'))
+# Pending links that trigger a flush from /process_pdf, which has no batch end of its own
+QUESTION_LINK_BATCH_SIZE = int(os.getenv('QUESTION_LINK_BATCH_SIZE', '20'))
+PENDING_LINKS_PATH = os.getenv('PENDING_LINKS_PATH', 'pendingLinks.json')
+BROKEN_LINKS_PATH = os.getenv('BROKEN_LINKS_PATH', 'brokenLinks.json')
+
+
+class QuestionLinker:
+    """
+    Deferred nextQuestionId linking.
+
+    Created questions are recorded in order as (previous_id, next_id) links
+    in a local file, so links survive a restart. flush applies them
+    concurrently with bounded parallelism, retries the failed ones once and
+    keeps whatever still fails for the next flush.
+
+    Each link must continue the chain applied so far: its previous_id must be
+    the next_id of an earlier link and must not have been linked already.
+    Links that break the chain are not applied; they are moved to a separate
+    broken links file, so they neither count toward batch_size nor are checked
+    again, and are kept there until dropped once the chain is repaired by hand.
+    """
+
+    def __init__(self, link, mode=QUESTION_LINK_MODE, concurrency=QUESTION_LINK_CONCURRENCY,
+                 batch_size=QUESTION_LINK_BATCH_SIZE, path=PENDING_LINKS_PATH, broken_path=BROKEN_LINKS_PATH):
+        if mode not in ("immediate", "deferred"):
+            raise ValueError(f"Unknown QUESTION_LINK_MODE: {mode}. Expected immediate or deferred")
+        self.link = link
+        self.deferred = mode == "deferred"
+        self.concurrency = concurrency
+        self.batch_size = batch_size
+        self.path = path
+        self.broken_path = broken_path
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self.linked = 0
+        self.retried = 0
+        self.failed = 0
+        self.flushes = 0
+        # next_ids the chain has reached and previous_ids already linked, in this process
+        self._next_ids = set()
+        self._linked_previous_ids = set()
+
+    def _read(self, path=None):
+        try:
+            with open(path or self.path, 'r') as f:
+                return [tuple(link) for link in json.load(f)]
+        except FileNotFoundError:
+            return []
+
+    def _write(self, links, path=None):
+        path = path or self.path
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump([list(link) for link in links], f)
+        os.replace(tmp_path, path)
+
+    def add(self, previous_id, next_id):
+        """Record that previous_id's nextQuestionId must be set to next_id."""
+        if not previous_id or not next_id:
+            logger.warning("Missing question IDs for link")
+            return
+        with self._lock:
+            links = self._read()
+            links.append((previous_id, next_id))
+            self._write(links)
+        logger.info(f"Deferred nextQuestionId link {previous_id} -> {next_id}, {len(links)} pending")
+
+    def pending(self):
+        with self._lock:
+            return self._read()
+
+    def broken(self):
+        """Return the links held back because they break the chain."""
+        with self._lock:
+            return self._read(self.broken_path)
+
+    def drop_broken(self):
+        """Forget the broken links, once the chain has been repaired by hand. Return how many were dropped."""
+        with self._lock:
+            dropped = len(self._read(self.broken_path))
+            self._write([], self.broken_path)
+        logger.info(f"Dropped {dropped} broken nextQuestionId links")
+        return dropped
+
+    def _apply(self, links, workers):
+        """Apply links and return the ones that failed."""
+        def apply(link):
+            try:
+                self.link(*link)
+                return None
+            except Exception as e:
+                logger.error(f"Error linking question {link[0]} -> {link[1]}: {e}")
+                return link
+
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            return [link for link in pool.map(apply, links) if link is not None]
+
+    def _split_broken(self, links):
+        """Return (continuous, broken) for links, in recorded order, against the chain applied so far."""
+        next_ids = set(self._next_ids)
+        previous_ids = set(self._linked_previous_ids)
+        continuous, broken = [], []
+        for previous_id, next_id in links:
+            if (next_ids and previous_id not in next_ids) or previous_id in previous_ids:
+                logger.warning(f"Question chain is broken at {previous_id} -> {next_id}, holding the link back")
+                broken.append((previous_id, next_id))
+            else:
+                continuous.append((previous_id, next_id))
+                previous_ids.add(previous_id)
+            # Later links continue from next_id whether or not this one is held back
+            next_ids.add(next_id)
+        return continuous, broken
+
+    def flush(self, force=True):
+        """
+        Apply the pending links, unless fewer than batch_size are pending and
+        force is False. Return the numbers linked, broken and still pending.
+        """
+        with self._flush_lock:
+            links = self.pending()
+            if not links or (not force and len(links) < self.batch_size):
+                return {"linked": 0, "broken": 0, "pending": len(links)}
+
+            continuous, broken = self._split_broken(links)
+            failed = self._apply(continuous, max(1, self.concurrency)) if continuous else []
+            if failed:
+                # Verification pass: retry what failed once, one at a time
+                self.retried += len(failed)
+                logger.warning(f"Retrying {len(failed)} of {len(continuous)} nextQuestionId links")
+                failed = self._apply(failed, 1)
+
+            # The chain now continues from what was actually applied; a failed
+            # link still continues it and is retried on the next flush
+            for previous_id, next_id in continuous:
+                self._next_ids.update((previous_id, next_id))
+                if (previous_id, next_id) not in failed:
+                    self._linked_previous_ids.add(previous_id)
+            for _, next_id in broken:
+                self._next_ids.add(next_id)
+
+            with self._lock:
+                # Keep the failures, in recorded order, and anything added while flushing
+                added = self._read()[len(links):]
+                self._write([link for link in links if link in failed] + added)
+                if broken:
+                    self._write(self._read(self.broken_path) + broken, self.broken_path)
+            linked = len(continuous) - len(failed)
+            self.linked += linked
+            self.failed += len(failed)
+            self.flushes += 1
+            if failed or broken:
+                logger.error(f"Linked {linked} of {len(links)} questions, {len(failed)} links kept for the next flush and {len(broken)} broken links held back")
+            else:
+                logger.info(f"Linked {linked} questions")
+            return {"linked": linked, "broken": len(broken), "pending": len(failed) + len(added)}
+
+    def stats(self):
+        """Return the link mode, flushes, links applied, retried and failed, broken links held back and those pending."""
+        return {
+            "mode": "deferred" if self.deferred else "immediate",
+            "flushes": self.flushes,
+            "linked": self.linked,
+            "retried": self.retried,
+            "failed": self.failed,
+            "broken": len(self.broken()),
+            "pending": len(self.pending())
+        }
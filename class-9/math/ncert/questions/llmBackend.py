@@ -0,0 +1,156 @@
+import asyncio
+import logging
+import os
+import random
+import re
+
+from questionIndex import estimate_tokens
+
+logger = logging.getLogger(__name__)
+
+LLM_BACKEND = os.getenv('LLM_BACKEND', 'gemini')
+GEMINI_MODEL_NAME = os.getenv('GEMINI_MODEL_NAME', 'gemini-2.0-flash')
+GENERATION_CONFIG = {}
+
+FAKE_LLM_LATENCY_SECONDS = float(os.getenv('FAKE_LLM_LATENCY_SECONDS', '0.5'))
+FAKE_LLM_LATENCY_JITTER_SECONDS = float(os.getenv('FAKE_LLM_LATENCY_JITTER_SECONDS', '0'))
+FAKE_LLM_ERROR_RATE = float(os.getenv('FAKE_LLM_ERROR_RATE', '0'))
+FAKE_LLM_ERROR_CODE = int(os.getenv('FAKE_LLM_ERROR_CODE', '429'))
+FAKE_LLM_MALFORMED_RATE = float(os.getenv('FAKE_LLM_MALFORMED_RATE', '0'))
+FAKE_LLM_SEED = os.getenv('FAKE_LLM_SEED')
+
+_QUESTION_NUMBERS_PATTERN = re.compile(r'Pick up (?:question numbers?|examples?)\s+([\w ,]+)', re.IGNORECASE)
+
+
+def usage_from(response):
+    """Return (prompt_tokens, candidate_tokens) from a Gemini response's usage_metadata, or None."""
+    usage = getattr(response, 'usage_metadata', None)
+    if usage is None:
+        return None
+    return getattr(usage, 'prompt_token_count', 0) or 0, getattr(usage, 'candidates_token_count', 0) or 0
+
+
+def fake_question_xml(question_no):
+    """Return a schema-valid question element for question_no."""
+    return (
+        "<question>"
+        f"<title><en><![CDATA[Fake question {question_no}]]></en></title>"
+        f"<englishTitle><![CDATA[Fake question {question_no}]]></englishTitle>"
+        f"<solution><en><![CDATA[Fake solution {question_no}]]></en></solution>"
+        f"<solutionWOLatex><en><![CDATA[Fake solution {question_no}]]></en></solutionWOLatex>"
+        f"<explanation><en><![CDATA[Fake explanation {question_no}]]></en></explanation>"
+        "<difficultyLevelCode>EASY</difficultyLevelCode>"
+        f"<questionNo>{question_no}</questionNo>"
+        "</question>"
+    )
+
+
+def fake_response_xml(prompt):
+    """Answer a prompt with one question per requested number, wrapped when there are several."""
+    match = _QUESTION_NUMBERS_PATTERN.search(prompt)
+    numbers = [n for n in re.split(r'[,\s]+', match.group(1)) if n] if match else ["1"]
+    if len(numbers) == 1:
+        return fake_question_xml(numbers[0])
+    return "<questions>" + "".join(fake_question_xml(n) for n in numbers) + "</questions>"
+
+
+class FakeLLMError(Exception):
+    """Injected API error carrying an HTTP status code like the Gemini client errors."""
+
+    def __init__(self, code):
+        super().__init__(f"Injected fake LLM error {code}")
+        self.code = code
+
+
+class LLMBackend:
+    """Base class for text generation backends."""
+
+    name = "base"
+    model_name = "base"
+
+    async def generate(self, prompt):
+        """Return (response_text, usage) for prompt, usage being (prompt_tokens, candidate_tokens) or None."""
+        raise NotImplementedError
+
+    async def count_tokens(self, prompt):
+        """Return the number of prompt tokens in prompt."""
+        return estimate_tokens(prompt)
+
+
+class GeminiBackend(LLMBackend):
+    """Generates with the Gemini API."""
+
+    name = "gemini"
+
+    def __init__(self, model_name=GEMINI_MODEL_NAME, generation_config=None):
+        import google.generativeai as genai
+
+        # Get API key from environment variable
+        api_key = os.getenv("GOOGLE_API_KEY")
+        if not api_key:
+            raise ValueError("GOOGLE_API_KEY environment variable is not set")
+
+        # Configure Gemini API
+        genai.configure(api_key=api_key)
+        self.model_name = model_name
+        self.generation_config = generation_config if generation_config is not None else GENERATION_CONFIG
+        self.model = genai.GenerativeModel(model_name, generation_config=self.generation_config)
+
+    async def generate(self, prompt):
+        response = await self.model.generate_content_async(prompt)
+        # response object should be printed as string in following logger
+        logger.info(f"Received response from Gemini: {response}")
+        return response.text, usage_from(response)
+
+    async def count_tokens(self, prompt):
+        response = await self.model.count_tokens_async(prompt)
+        return response.total_tokens
+
+
+class FakeLLMBackend(LLMBackend):
+    """
+    Deterministic offline backend for load testing.
+
+    Returns canned, schema-valid question XML for the numbers the prompt asks
+    for, after a configurable latency, and injects API errors and malformed
+    XML at configurable rates.
+    """
+
+    name = "fake"
+    model_name = "fake"
+
+    def __init__(self, latency_seconds=FAKE_LLM_LATENCY_SECONDS, latency_jitter_seconds=FAKE_LLM_LATENCY_JITTER_SECONDS,
+                 error_rate=FAKE_LLM_ERROR_RATE, error_code=FAKE_LLM_ERROR_CODE, malformed_rate=FAKE_LLM_MALFORMED_RATE,
+                 seed=FAKE_LLM_SEED):
+        self.latency_seconds = latency_seconds
+        self.latency_jitter_seconds = latency_jitter_seconds
+        self.error_rate = error_rate
+        self.error_code = error_code
+        self.malformed_rate = malformed_rate
+        self.random = random.Random(seed)
+        self.generation_config = {}
+
+    async def generate(self, prompt):
+        await asyncio.sleep(self.latency_seconds + self.random.uniform(0, self.latency_jitter_seconds))
+        if self.random.random() < self.error_rate:
+            raise FakeLLMError(self.error_code)
+        response_text = fake_response_xml(prompt)
+        if self.random.random() < self.malformed_rate:
+            response_text = response_text[:len(response_text) // 2]
+        logger.info(f"Received response from fake LLM backend: {response_text[:200]}...")
+        return response_text, (estimate_tokens(prompt), estimate_tokens(response_text))
+
+
+LLM_BACKENDS = {
+    GeminiBackend.name: GeminiBackend,
+    FakeLLMBackend.name: FakeLLMBackend
+}
+
+
+def get_llm_backend(name=LLM_BACKEND):
+    """Build the LLM backend selected by LLM_BACKEND (gemini or fake)."""
+    if name not in LLM_BACKENDS:
+        raise ValueError(f"Unknown LLM backend: {name}. Expected one of {sorted(LLM_BACKENDS)}")
+    backend = LLM_BACKENDS[name]()
+    logger.info(f"Using {backend.name} LLM backend with model {backend.model_name}")
+    return backend
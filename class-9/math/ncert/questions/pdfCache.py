@@ -0,0 +1,106 @@
+import hashlib
+import logging
+import os
+import threading
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+PDF_CACHE_DIR = os.getenv('PDF_CACHE_DIR', '.pdf_cache')
+PDF_CACHE_MEMORY_ENTRIES = int(os.getenv('PDF_CACHE_MEMORY_ENTRIES', '32'))
+
+
+def hash_pdf_file(pdf_path, chunk_size=1024 * 1024):
+    """Return the SHA-256 hex digest of the PDF bytes."""
+    digest = hashlib.sha256()
+    with open(pdf_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class PdfTextCache:
+    """
+    Content-addressed cache of extracted PDF text.
+
+    Entries are keyed by the SHA-256 of the PDF bytes plus the extractor
+    version, kept on disk under cache_dir and fronted by an in-memory LRU.
+    """
+
+    def __init__(self, cache_dir=PDF_CACHE_DIR, max_memory_entries=PDF_CACHE_MEMORY_ENTRIES):
+        self.cache_dir = cache_dir
+        self.max_memory_entries = max_memory_entries
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+    def key_for(self, pdf_path, extractor_version):
+        """Build the cache key for a PDF file and extractor version."""
+        return f"{hash_pdf_file(pdf_path)}-{extractor_version}"
+
+    def _disk_path(self, key):
+        return os.path.join(self.cache_dir, key[:2], f"{key}.txt")
+
+    def _remember(self, key, text):
+        self._memory[key] = text
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_memory_entries:
+            self._memory.popitem(last=False)
+
+    def get(self, key):
+        """Return cached text for key, or None on a miss."""
+        with self._lock:
+            if key in self._memory:
+                self._memory.move_to_end(key)
+                self.memory_hits += 1
+                return self._memory[key]
+
+        path = self._disk_path(key)
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                text = f.read()
+        except FileNotFoundError:
+            with self._lock:
+                self.misses += 1
+            return None
+        except Exception as e:
+            logger.error(f"Error reading PDF text cache entry {path}: {e}")
+            with self._lock:
+                self.misses += 1
+            return None
+
+        with self._lock:
+            self.disk_hits += 1
+            self._remember(key, text)
+        return text
+
+    def put(self, key, text):
+        """Store text for key in memory and on disk."""
+        with self._lock:
+            self._remember(key, text)
+
+        path = self._disk_path(key)
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                f.write(text)
+            os.replace(tmp_path, path)
+        except Exception as e:
+            logger.error(f"Error writing PDF text cache entry {path}: {e}")
+
+    def stats(self):
+        """Return hit/miss counters for this process."""
+        with self._lock:
+            hits = self.memory_hits + self.disk_hits
+            lookups = hits + self.misses
+            return {
+                "hits": hits,
+                "memoryHits": self.memory_hits,
+                "diskHits": self.disk_hits,
+                "misses": self.misses,
+                "hitRate": round(hits / lookups, 4) if lookups else 0.0,
+                "memoryEntries": len(self._memory)
+            }
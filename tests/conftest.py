@@ -0,0 +1,68 @@
+import glob
+import os
+import shutil
+import subprocess
+import sys
+
+import PyPDF2
+import pytest
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BOOK_DIR = os.path.join(ROOT_DIR, "class-11", "math", "ncert", "book")
+QUESTIONS_DIR = os.path.join(ROOT_DIR, "class-11", "math", "ncert", "questions")
+
+# The modules read their settings when imported, so these are set before any test imports them
+TEST_SETTINGS = {
+    "LLM_BACKEND": "fake",
+    "FAKE_LLM_LATENCY_SECONDS": "0",
+    "QUESTION_SINK": "local",
+    "GEMINI_RETRY_BASE_SECONDS": "0"
+}
+os.environ.update(TEST_SETTINGS)
+os.environ.pop("GOOGLE_API_KEY", None)
+
+# The grade directories share the same modules; test the class-11 copies
+sys.path.insert(0, QUESTIONS_DIR)
+
+
+@pytest.fixture
+def book_text():
+    """Return the extracted text of a class-11 book PDF, e.g. book_text("ch-1/ex-1.1.pdf")."""
+    def extract(relative_path):
+        with open(os.path.join(BOOK_DIR, relative_path), 'rb') as f:
+            reader = PyPDF2.PdfReader(f)
+            return "\n".join(page.extract_text() or '' for page in reader.pages)
+    return extract
+
+
+@pytest.fixture
+def run_with_dotenv(tmp_path):
+    """
+    Run code in a fresh interpreter next to a copy of the modules, with settings
+    only in its .env file, and return what it prints.
+    """
+    def run(settings, code):
+        for path in glob.glob(os.path.join(QUESTIONS_DIR, "*.py")):
+            shutil.copy(path, tmp_path)
+        (tmp_path / ".env").write_text("".join(f"{name}={value}\n" for name, value in settings.items()))
+        env = {name: value for name, value in os.environ.items() if name not in settings and name not in TEST_SETTINGS}
+        result = subprocess.run([sys.executable, "-c", code], cwd=tmp_path, env=env, capture_output=True, text=True, timeout=120)
+        assert result.returncode == 0, result.stderr
+        return result.stdout.strip().splitlines()[-1]
+    return run
+
+
+@pytest.fixture(scope="session")
+def app_dir(tmp_path_factory):
+    return tmp_path_factory.mktemp("app")
+
+
+@pytest.fixture
+def app_module(app_dir, monkeypatch):
+    """
+    Return the app module, imported once with the fake LLM backend and the local
+    question sink, running in a scratch directory for its caches and state files.
+    """
+    monkeypatch.chdir(app_dir)
+    import app
+    return app
@@ -0,0 +1,20 @@
+import asyncio
+
+import pytest
+from fastapi import HTTPException
+
+from requestStats import RequestRecord
+
+
+def test_metrics_include_links_and_outbox(app_module):
+    metrics = asyncio.run(app_module.metrics())
+
+    assert metrics["links"] == app_module.question_linker.stats()
+    assert metrics["outbox"]["enabled"] == app_module.question_outbox.enabled
+
+
+def test_unknown_document_is_not_found(app_module):
+    with pytest.raises(HTTPException) as error:
+        asyncio.run(app_module.load_pdf_text(None, "missing", RequestRecord("test")))
+
+    assert error.value.status_code == 404
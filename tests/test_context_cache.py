@@ -0,0 +1,71 @@
+import asyncio
+
+from contextCache import ContextCacheManager, FakeContextCacheBackend
+
+LONG_PREFIX = "x" * 400
+
+
+class FailingBackend(FakeContextCacheBackend):
+    def __init__(self):
+        super().__init__()
+        self.attempts = 0
+
+    async def create(self, display_name, prefix, ttl_seconds):
+        self.attempts += 1
+        raise RuntimeError("cached content is not supported")
+
+
+def test_short_prefix_is_not_cached():
+    manager = ContextCacheManager(FakeContextCacheBackend(), min_tokens=100)
+
+    assert not manager.cacheable("doc", "short prefix")
+    assert asyncio.run(manager.get_or_create("doc", "short prefix")) is None
+    assert manager.backend.created == 0
+    assert manager.stats()["skipped"] == 1
+
+
+def test_long_prefix_is_cached_and_reused():
+    manager = ContextCacheManager(FakeContextCacheBackend(), min_tokens=100)
+
+    async def run():
+        first = await manager.get_or_create("doc", LONG_PREFIX)
+        second = await manager.get_or_create("doc", LONG_PREFIX)
+        return first, second
+
+    first, second = asyncio.run(run())
+    assert first is second
+    assert manager.stats()["creates"] == 1
+    assert manager.stats()["reuses"] == 1
+
+
+def test_failed_key_is_not_retried_within_ttl():
+    backend = FailingBackend()
+    manager = ContextCacheManager(backend, min_tokens=100)
+
+    async def run():
+        return [await manager.get_or_create("doc", LONG_PREFIX) for _ in range(3)]
+
+    assert asyncio.run(run()) == [None, None, None]
+    assert backend.attempts == 1
+    assert not manager.cacheable("doc", LONG_PREFIX)
+    assert manager.stats()["failures"] == 1
+    assert manager.stats()["skipped"] == 2
+
+
+def test_scheduler_is_charged_for_the_cached_prefix(app_module, monkeypatch):
+    from questionIndex import estimate_tokens
+    from retryEngine import AttemptLog
+
+    manager = ContextCacheManager(FakeContextCacheBackend(), min_tokens=100)
+    charged = []
+
+    async def acquire(estimated_tokens, caller="default"):
+        charged.append(estimated_tokens)
+
+    monkeypatch.setattr(app_module, "context_cache", manager)
+    monkeypatch.setattr(app_module.gemini_scheduler, "acquire", acquire)
+
+    asyncio.run(app_module.call_llm("Pick up question number 1", "test", AttemptLog(), ("doc", LONG_PREFIX, None)))
+
+    assert charged == [estimate_tokens(LONG_PREFIX) + estimate_tokens("Pick up question number 1") + app_module.GEMINI_EXPECTED_OUTPUT_TOKENS]
+    assert manager.stats()["creates"] == 1
@@ -0,0 +1,50 @@
+import os
+from concurrent.futures import Future
+
+import PyPDF2
+
+import pdfOcr
+from conftest import BOOK_DIR
+from pdfCache import PdfTextCache
+from pdfOcr import OcrFallback, hash_page
+
+EXERCISE_PDF = os.path.join(BOOK_DIR, "ch-1", "ex-1.1.pdf")
+EXERCISES_PDF = os.path.join(BOOK_DIR, "ch-1", "exercises.pdf")
+
+
+class InlinePool:
+    def submit(self, func, *args):
+        future = Future()
+        future.set_result(func(*args))
+        return future
+
+
+def page_hashes(pdf_path):
+    with open(pdf_path, 'rb') as f:
+        return [hash_page(page) for page in PyPDF2.PdfReader(f).pages]
+
+
+def test_shared_pages_have_the_same_hash():
+    exercise_hashes = page_hashes(EXERCISE_PDF)
+    exercises_hashes = page_hashes(EXERCISES_PDF)
+
+    assert exercises_hashes[:len(exercise_hashes)] == exercise_hashes
+    assert len(set(exercises_hashes)) == len(exercises_hashes)
+
+
+def test_shared_pages_are_ocrd_once(tmp_path, monkeypatch):
+    ocr_calls = []
+
+    def fake_ocr_page(pdf_path, page_index):
+        ocr_calls.append((os.path.basename(pdf_path), page_index))
+        return f"OCR text of page {page_index + 1} of {os.path.basename(pdf_path)}"
+
+    monkeypatch.setattr(pdfOcr, "ocr_page", fake_ocr_page)
+    # Every page scores below a threshold above 1, so every page is OCR'd
+    fallback = OcrFallback(quality_threshold=2, cache=PdfTextCache(cache_dir=str(tmp_path)))
+
+    fallback.repair(EXERCISE_PDF, ["", ""], InlinePool())
+    repaired = fallback.repair(EXERCISES_PDF, [""] * 11, InlinePool())
+
+    assert repaired[0] == "OCR text of page 1 of ex-1.1.pdf"
+    assert ocr_calls == [("ex-1.1.pdf", 0), ("ex-1.1.pdf", 1)] + [("exercises.pdf", i) for i in range(2, 11)]
@@ -0,0 +1,39 @@
+import asyncio
+import json
+
+from questionSink import LocalQuestionSink
+from requestStats import RequestRecord
+
+FIELDS = {
+    "status": "draft",
+    "gradeCode": "11",
+    "subjectCode": "math",
+    "topicCode": "sets",
+    "postedByUserId": "user",
+    "board": "cbse",
+    "source": "ncert",
+    "chapterNo": "1",
+    "exerciseCode": "1.1"
+}
+
+
+def test_questions_are_persisted_in_order(app_module, tmp_path, monkeypatch):
+    import createQuestion
+
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(createQuestion, "question_sink", LocalQuestionSink(str(tmp_path / "sink")))
+    record = RequestRecord("test")
+
+    async def persist_all():
+        return [
+            await app_module.persist_question(record, number, {"questionNo": number}, FIELDS, "v1")
+            for number in ("1", "2")
+        ]
+
+    first, second = asyncio.run(persist_all())
+
+    assert (first["seqNumber"], second["seqNumber"]) == (10, 20)
+    assert first["exerciseCode"] == "1.1"
+    assert json.loads((tmp_path / "sequence_numbers.json").read_text()) == {"sequence": 20}
+    assert json.loads((tmp_path / "question_numbers.json").read_text()) == {"question": "2"}
+    assert record.questions == 2
@@ -0,0 +1,92 @@
+import pytest
+
+from questionIndex import QuestionIndex
+
+
+def test_questions_are_indexed_after_the_exercise_heading(book_text):
+    text = book_text("ch-1/ex-1.1.pdf")
+    index = QuestionIndex(text, "questions", context_chars=0)
+
+    assert sorted(index.spans, key=int) == ["1", "2", "3", "4", "5", "6"]
+    segment = index.segment_for_many(["3"])
+    assert "Write the following sets in roster form" in segment
+    assert "Example 3" not in segment
+
+
+def test_inline_questions_index_their_line_starts(book_text):
+    text = book_text("ch-8/ex-8.1.pdf")
+    index = QuestionIndex(text, "questions", context_chars=0)
+
+    # Questions 2, 3, 5 and 6 start mid-line, so they fall inside the segment before them
+    assert sorted(index.spans, key=int) == ["1", "4", "7", "9", "11", "13", "14"]
+    segment = index.segment_for_many(["4"])
+    assert segment.startswith("4. an")
+    assert "6n−5. an" in segment
+    assert index.segment_for_many(["2"]) == text
+
+
+def test_miscellaneous_exercise_heading(book_text):
+    index = QuestionIndex(book_text("ch-1/misc-ch-1.pdf"), "questions")
+
+    assert sorted(index.spans, key=int) == [str(n) for n in range(1, 11)]
+
+
+def test_examples_mode_uses_example_markers(book_text):
+    text = book_text("ch-4/ch-4-examples.pdf")
+    index = QuestionIndex(text, "examples", context_chars=0)
+
+    assert sorted(index.spans, key=int) == [str(n) for n in range(1, 9)]
+    assert index.segment_for_many(["2"]).lstrip().startswith("Example 2")
+
+
+def test_numbers_skipped_by_the_markers_are_not_covered():
+    text = "EXERCISE 2.1\n1. First question\n2. Second question 3. Third question\n5. Fifth question\n"
+    index = QuestionIndex(text, "questions", context_chars=0)
+
+    assert sorted(index.spans, key=int) == ["1", "2", "5"]
+    assert "3. Third question" in index.segment_for_many(["2"])
+    assert not index.covers(["3"])
+    assert index.segment_for_many(["3"]) == text
+
+
+def test_examples_index_survives_garbled_example_numbers(book_text):
+    # "Example 11" is extracted as "Example 1 1", so it ends up inside example 10's segment
+    text = book_text("ch-1/ch-1-examples.pdf")
+    index = QuestionIndex(text, "examples", context_chars=0)
+
+    assert len(index.spans) >= 20
+    assert not index.covers(["11"])
+    segment = index.segment_for_many(["10"])
+    assert segment.startswith("Example 10")
+    assert "Example 1 1" in segment
+    assert len(segment) < len(text) / 10
+
+
+@pytest.mark.parametrize("path", [
+    "ch-2/class-11-ch-2-examples.pdf",
+    "ch-3/ch-3-examples.pdf",
+    "ch-5/ch-5-examples.pdf",
+    "ch-6/ch-6-examples.pdf",
+    "ch-8/ch-8-examples.pdf",
+])
+def test_long_example_pdfs_are_indexed(book_text, path):
+    text = book_text(path)
+    index = QuestionIndex(text, "examples", context_chars=0)
+
+    assert index.covers(["1", "2", "3"])
+    segment = index.segment_for_many(["2"])
+    assert segment.startswith("Example 2")
+    assert len(segment) < len(text) / 4
+
+
+def test_unknown_mode():
+    with pytest.raises(ValueError):
+        QuestionIndex("", "answers")
+
+
+def test_covers(book_text):
+    index = QuestionIndex(book_text("ch-1/ex-1.1.pdf"), "questions")
+
+    assert index.covers(["2", "3"])
+    assert not index.covers(["6", "7"])
+    assert not index.covers([])
@@ -0,0 +1,59 @@
+from questionLinker import QuestionLinker
+
+
+class FlakyLink:
+    """Records applied links and fails each link in fail_times as many times as given."""
+
+    def __init__(self, fail_times=None):
+        self.fail_times = dict(fail_times or {})
+        self.applied = []
+
+    def __call__(self, previous_id, next_id):
+        if self.fail_times.get((previous_id, next_id), 0):
+            self.fail_times[(previous_id, next_id)] -= 1
+            raise RuntimeError("link failed")
+        self.applied.append((previous_id, next_id))
+
+
+def make_linker(tmp_path, link):
+    return QuestionLinker(link, mode="deferred", concurrency=2, batch_size=3,
+                          path=str(tmp_path / "pendingLinks.json"), broken_path=str(tmp_path / "brokenLinks.json"))
+
+
+def test_failed_link_is_retried_without_breaking_the_chain(tmp_path):
+    link = FlakyLink({("b", "c"): 2})
+    linker = make_linker(tmp_path, link)
+    for previous_id, next_id in [("a", "b"), ("b", "c"), ("c", "d")]:
+        linker.add(previous_id, next_id)
+
+    assert linker.flush() == {"linked": 2, "broken": 0, "pending": 1}
+    assert linker.pending() == [("b", "c")]
+
+    linker.add("d", "e")
+    assert linker.flush() == {"linked": 2, "broken": 0, "pending": 0}
+    assert sorted(link.applied) == [("a", "b"), ("b", "c"), ("c", "d"), ("d", "e")]
+
+
+def test_broken_links_are_held_back(tmp_path):
+    link = FlakyLink()
+    linker = make_linker(tmp_path, link)
+    linker.add("a", "b")
+    assert linker.flush() == {"linked": 1, "broken": 0, "pending": 0}
+
+    # "a" was already linked to "b", and "x" is not where the chain reached
+    linker.add("a", "c")
+    linker.add("x", "y")
+    linker.add("b", "d")
+    assert linker.flush() == {"linked": 1, "broken": 2, "pending": 0}
+    assert link.applied == [("a", "b"), ("b", "d")]
+    assert linker.pending() == []
+    assert linker.broken() == [("a", "c"), ("x", "y")]
+    assert linker.stats()["broken"] == 2
+
+    # Broken links are not checked again and do not count toward the batch size
+    linker.add("d", "e")
+    assert linker.flush(force=False) == {"linked": 0, "broken": 0, "pending": 1}
+    assert linker.flush() == {"linked": 1, "broken": 0, "pending": 0}
+
+    assert linker.drop_broken() == 2
+    assert linker.broken() == []
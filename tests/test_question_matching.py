@@ -0,0 +1,33 @@
+import pytest
+
+
+def question(question_no):
+    return {"questionNo": question_no, "title": {"en": f"Question {question_no}"}}
+
+
+def test_questions_are_matched_by_question_no(app_module):
+    questions = [question("4"), question("Q3"), question("Example 5.")]
+
+    matched = app_module.match_questions(["3", "4", "5"], questions)
+
+    assert [(number, json_data["questionNo"]) for number, json_data in matched] == [("3", "Q3"), ("4", "4"), ("5", "Example 5.")]
+
+
+def test_matching_stops_at_the_first_missing_number(app_module):
+    matched = app_module.match_questions(["3", "4", "5"], [question("3"), question("5")])
+
+    assert [number for number, _ in matched] == ["3"]
+
+
+def test_response_without_the_first_number_is_rejected(app_module):
+    with pytest.raises(ValueError):
+        app_module.match_questions(["3", "4"], [question("4"), question("5")])
+
+
+def test_single_question_parser_rejects_another_question(app_module):
+    from llmBackend import fake_question_xml
+
+    parse = app_module.parse_question_for("7")
+    assert parse(fake_question_xml("7"))["questionNo"] == "7"
+    with pytest.raises(ValueError):
+        parse(fake_question_xml("1"))
@@ -0,0 +1,77 @@
+import asyncio
+
+from questionOutbox import OutboxDispatcher, QuestionOutbox
+
+
+class FakeQuestionApi:
+    """Creates questions with sequential ids and fails the first link_failures links."""
+
+    def __init__(self, link_failures=0):
+        self.link_failures = link_failures
+        self.created = []
+        self.links = []
+        self.previous_question_id = "q0"
+
+    async def send(self, payload, idempotency_key):
+        question_id = f"q{len(self.created) + 1}"
+        self.created.append(payload)
+        return {"data": {"id": question_id}}, self.previous_question_id
+
+    async def link(self, previous_question_id, question_id):
+        if self.link_failures:
+            self.link_failures -= 1
+            raise RuntimeError("link failed")
+        self.links.append((previous_question_id, question_id))
+        self.previous_question_id = question_id
+
+
+def make_outbox(tmp_path):
+    return QuestionOutbox(path=str(tmp_path / "outbox.sqlite3"), enabled=True, retry_base_seconds=0.01)
+
+
+def run_dispatcher(dispatcher, timeout=5):
+    async def run():
+        dispatcher.start()
+        try:
+            return await dispatcher.drain(timeout)
+        finally:
+            dispatcher._task.cancel()
+    return asyncio.run(run())
+
+
+def test_failed_link_is_retried_without_creating_the_question_again(tmp_path):
+    outbox = make_outbox(tmp_path)
+    api = FakeQuestionApi(link_failures=1)
+    outbox.append({"title": "first"})
+    outbox.append({"title": "second"})
+
+    assert run_dispatcher(OutboxDispatcher(outbox, api.send, api.link, poll_seconds=0.01))
+
+    assert api.created == [{"title": "first"}, {"title": "second"}]
+    assert api.links == [("q0", "q1"), ("q1", "q2")]
+    stats = outbox.stats()
+    assert stats["sent"] == 2
+    assert stats["created"] == 0
+
+
+def test_created_entry_waits_for_its_link(tmp_path):
+    outbox = make_outbox(tmp_path)
+    outbox_id = outbox.append({"title": "first"})["outboxId"]
+    outbox.mark_created(outbox_id, "q1", "q0")
+
+    assert outbox.next_pending()[5] == ("q1", "q0")
+    assert outbox.mark_failed(outbox_id, 0, RuntimeError("link failed")) == "created"
+    assert outbox.stats()["created"] == 1
+
+
+def test_entry_that_dies_after_create_is_listed_with_its_question_id(tmp_path):
+    outbox = QuestionOutbox(path=str(tmp_path / "outbox.sqlite3"), enabled=True, max_attempts=1, retry_base_seconds=0.01)
+    api = FakeQuestionApi(link_failures=1)
+    outbox_id = outbox.append({"title": "first"})["outboxId"]
+
+    assert run_dispatcher(OutboxDispatcher(outbox, api.send, api.link, poll_seconds=0.01))
+
+    dead = outbox.dead_entries()
+    assert [(entry["outboxId"], entry["questionId"], entry["previousQuestionId"]) for entry in dead] == [(outbox_id, "q1", "q0")]
+    assert outbox.requeue_dead() == 1
+    assert outbox.next_pending()[5] == ("q1", "q0")
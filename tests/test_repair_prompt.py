@@ -0,0 +1,91 @@
+import asyncio
+
+import pytest
+
+from llmBackend import FakeLLMError, fake_question_xml
+from retryEngine import RetryEngine, build_repair_prompt
+
+INSTRUCTION = "Pick up question number 7"
+
+
+class ScriptedBackend:
+    """Returns the scripted responses in order and keeps the prompts it was sent."""
+
+    def __init__(self, *responses):
+        self.responses = list(responses)
+        self.prompts = []
+
+    async def generate(self, prompt):
+        self.prompts.append(prompt)
+        return self.responses.pop(0), None
+
+
+def test_transient_errors_are_retried():
+    engine = RetryEngine(max_attempts=3, base_delay=0)
+    errors = [FakeLLMError(503), FakeLLMError(429)]
+
+    async def call():
+        if errors:
+            raise errors.pop(0)
+        return "ok"
+
+    assert asyncio.run(engine.run(call)) == "ok"
+    assert not errors
+
+
+def test_parse_errors_are_not_retried():
+    engine = RetryEngine(max_attempts=3, base_delay=0)
+    calls = []
+
+    async def call():
+        calls.append(1)
+        raise ValueError("no element found")
+
+    with pytest.raises(ValueError):
+        asyncio.run(engine.run(call))
+    assert len(calls) == 1
+
+
+def test_repair_prompt_repeats_the_instruction():
+    repair_prompt = build_repair_prompt("<question><questionNo>7", "no element found", INSTRUCTION)
+
+    assert "could not be parsed: no element found" in repair_prompt
+    assert INSTRUCTION in repair_prompt
+    assert repair_prompt.endswith("<question><questionNo>7")
+
+
+def test_repair_prompt_without_instruction():
+    repair_prompt = build_repair_prompt("<question>", "no element found")
+
+    assert repair_prompt.endswith("Do not add any explanation.\n\n<question>")
+
+
+def test_truncated_response_is_repaired(app_module, monkeypatch):
+    truncated = fake_question_xml("7")[:60]
+    backend = ScriptedBackend(truncated, fake_question_xml("7"))
+    monkeypatch.setattr(app_module, "llm_backend", backend)
+    monkeypatch.setattr(app_module, "retry_engine", RetryEngine(base_delay=0, repair_attempts=1))
+
+    json_data = asyncio.run(app_module.generate_parsed(
+        INSTRUCTION, "key", app_module.parse_question_for("7"), bypass_cache=True, instruction=INSTRUCTION
+    ))
+
+    assert json_data["questionNo"] == "7"
+    assert INSTRUCTION in backend.prompts[1]
+    assert backend.prompts[1].endswith(truncated)
+    assert app_module.retry_engine.stats()["repaired"]["calls"] == 2
+
+
+def test_repair_gives_up_after_repair_attempts(app_module, monkeypatch):
+    truncated = fake_question_xml("7")[:60]
+    backend = ScriptedBackend(truncated, truncated)
+    monkeypatch.setattr(app_module, "llm_backend", backend)
+    monkeypatch.setattr(app_module, "retry_engine", RetryEngine(base_delay=0, repair_attempts=1))
+
+    with pytest.raises(ValueError):
+        asyncio.run(app_module.generate_parsed(
+            INSTRUCTION, "key", app_module.parse_question_for("7"), bypass_cache=True, instruction=INSTRUCTION
+        ))
+
+    assert len(backend.prompts) == 2
+    assert app_module.retry_engine.stats()["parse_failure"]["calls"] == 2
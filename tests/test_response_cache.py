@@ -0,0 +1,37 @@
+import asyncio
+
+import pytest
+
+from llmBackend import fake_question_xml
+from responseCache import LlmResponseCache
+
+PROMPT = "Pick up question number 7"
+
+
+@pytest.fixture
+def response_cache(app_module, tmp_path, monkeypatch):
+    cache = LlmResponseCache(path=str(tmp_path / "llmResponses.db"), enabled=True)
+    monkeypatch.setattr(app_module, "llm_response_cache", cache)
+    return cache
+
+
+def generate(app_module, parse):
+    return asyncio.run(app_module.generate_parsed(PROMPT, "key", parse))
+
+
+def test_cached_response_for_another_question_is_replaced(app_module, response_cache):
+    response_cache.put("key", fake_question_xml("1"))
+
+    json_data = generate(app_module, app_module.parse_question_for("7"))
+
+    assert json_data["questionNo"] == "7"
+    assert app_module.parse_question_for("7")(response_cache.get("key"))["questionNo"] == "7"
+
+
+def test_rejected_response_is_not_cached(app_module, response_cache, monkeypatch):
+    monkeypatch.setattr(app_module.retry_engine, "repair_attempts", 0)
+
+    with pytest.raises(ValueError):
+        generate(app_module, app_module.parse_question_for("8"))
+
+    assert response_cache.get("key") is None
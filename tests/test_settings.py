@@ -0,0 +1,28 @@
+def test_app_reads_settings_from_dotenv(run_with_dotenv):
+    settings = {"LLM_BACKEND": "fake", "GEMINI_CONTEXT_CACHE": "fake", "BATCH_CHUNK_SIZE": "3"}
+
+    output = run_with_dotenv(settings, "import app; print(app.llm_backend.name, app.context_cache.backend.name, app.BATCH_CHUNK_SIZE)")
+
+    assert output == "fake fake 3"
+
+
+def test_question_sink_reads_settings_from_dotenv(run_with_dotenv):
+    output = run_with_dotenv({"QUESTION_SINK": "local"}, "import createQuestion; print(createQuestion.question_sink.name)")
+
+    assert output == "local"
+
+
+def test_outbox_reads_settings_from_dotenv(run_with_dotenv):
+    settings = {"LLM_BACKEND": "fake", "QUESTION_OUTBOX_ENABLED": "true", "QUESTION_OUTBOX_DRAIN_SECONDS": "7"}
+
+    output = run_with_dotenv(settings, "import app; print(app.question_outbox.enabled, app.QUESTION_OUTBOX_DRAIN_SECONDS)")
+
+    assert output == "True 7.0"
+
+
+def test_question_linker_reads_settings_from_dotenv(run_with_dotenv):
+    settings = {"QUESTION_LINK_MODE": "deferred", "QUESTION_LINK_BATCH_SIZE": "5"}
+
+    output = run_with_dotenv(settings, "import createQuestion; print(createQuestion.question_linker.deferred, createQuestion.question_linker.batch_size)")
+
+    assert output == "True 5"